@@ -0,0 +1,177 @@
+import socket
+import threading
+import time
+from collections import deque
+
+'''
+Outbound TCP channel for state broadcasts that never blocks Live's thread.
+
+send() only appends to a bounded queue; when the queue is full the oldest
+message is dropped. A daemon thread owns the socket: it connects, drains
+the queue and, when the connection fails or drops, reconnects with
+exponential backoff. The thread must not touch Live or the log, so failures
+are only counted here and reported through describe() from the script.
+
+With an on_connect callback the channel connects without waiting for a
+message, and every new connection starts with what the callback returns
+instead of whatever was still queued, e.g. a full state snapshot that
+supersedes the queued deltas. The callback runs on the sender thread.
+'''
+
+DEFAULT_HOST = 'localhost'
+DEFAULT_PORT = 60090
+DEFAULT_QUEUE_SIZE = 256
+
+CONNECT_TIMEOUT = 1.0
+# Longest close() waits for the sender thread, on Live's thread
+CLOSE_TIMEOUT = 0.005
+SEND_TIMEOUT = 2.0
+MIN_BACKOFF = 0.5
+MAX_BACKOFF = 30.0
+
+
+class BroadcastChannel(object):
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT,
+                 queue_size=DEFAULT_QUEUE_SIZE, min_backoff=MIN_BACKOFF,
+                 max_backoff=MAX_BACKOFF, on_connect=None):
+        self.address = (host, port)
+        self.on_connect = on_connect
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self._queue = deque(maxlen=queue_size)
+        self._wakeup = threading.Condition(threading.Lock())
+        self._socket = None
+        self._thread = None
+        self._running = False
+        self.queued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.connects = 0
+        self.failures = 0
+        self.last_error = None
+
+    @property
+    def connected(self):
+        return self._socket is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run,
+                                        name='KompleteKontrolBroadcast')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def send(self, data):
+        '''Queues data (bytes, or text sent as UTF-8). Never blocks on the network.'''
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        with self._wakeup:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(data)
+            self.queued += 1
+            self._wakeup.notify()
+
+    def pending(self):
+        return len(self._queue)
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        '''
+        Stops the sender thread. A thread still stuck in a connect or a send
+        after timeout exits on its own, closing its socket; it is a daemon.
+        '''
+        with self._wakeup:
+            self._running = False
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._disconnect()
+
+    def describe(self):
+        return 'sent=%d dropped=%d pending=%d connects=%d failures=%d%s' % (
+            self.sent, self.dropped, len(self._queue), self.connects,
+            self.failures, ' last error: %s' % self.last_error if self.last_error else '')
+
+    # Sender thread
+
+    def _run(self):
+        backoff = self.min_backoff
+        while True:
+            with self._wakeup:
+                while self._running and not self._queue and \
+                        (self._socket is not None or self.on_connect is None):
+                    self._wakeup.wait()
+                if not self._running:
+                    break
+            if self._socket is None:
+                if not self._connect():
+                    self._sleep(backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+                    continue
+                backoff = self.min_backoff
+            self._drain()
+        self._disconnect()
+
+    def _connect(self):
+        try:
+            self._socket = socket.create_connection(self.address, CONNECT_TIMEOUT)
+            self._socket.settimeout(SEND_TIMEOUT)
+        except (socket.error, OSError) as e:
+            self._socket = None
+            self._failed(e)
+            return False
+        self.connects += 1
+        if self.on_connect is not None:
+            with self._wakeup:
+                greeting = self.on_connect()
+                self._queue.clear()
+                if greeting:
+                    self._queue.append(greeting)
+        return True
+
+    def _drain(self):
+        while self._running:
+            with self._wakeup:
+                if not self._queue:
+                    return
+                data = self._queue.popleft()
+            try:
+                self._socket.sendall(data)
+            except (socket.error, OSError) as e:
+                with self._wakeup:
+                    # Retried first after reconnecting, unless newer
+                    # messages filled the queue meanwhile
+                    if len(self._queue) < self._queue.maxlen:
+                        self._queue.appendleft(data)
+                    else:
+                        self.dropped += 1
+                self._disconnect()
+                self._failed(e)
+                return
+            self.sent += 1
+
+    def _failed(self, error):
+        self.failures += 1
+        self.last_error = str(error)
+
+    def _sleep(self, seconds):
+        deadline = time.time() + seconds
+        with self._wakeup:
+            while self._running:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return
+                self._wakeup.wait(remaining)
+
+    def _disconnect(self):
+        sock = self._socket
+        self._socket = None
+        if sock is not None:
+            try:
+                sock.close()
+            except (socket.error, OSError):
+                pass
@@ -0,0 +1,161 @@
+from GUtil import live_id
+
+'''
+Memoizes results of walks over a track's device tree.
+
+Entries are keyed by Live object identity, one per subject looked up (a
+track); the walk below it is not cached. The first lookup of a subject, and
+the first after its entry was dropped, only walks: one-off lookups, like the
+status update after arming a track or changing its devices, cost no more
+than the walk. The next lookup stores the entry. The resolver hands over
+the chains it read for a rack through watch() and names the device each
+result was taken from through pick(). Once stored, the racks on the picked
+path are observed (their chains, and the devices of each chain); a change
+there, or invalidate() on any device of the path, drops the entry. Racks off
+the path cost no listeners; a change inside one is only seen once the
+track's devices or a rack on the path change. Track entries are dropped by
+the owner of the track's devices listener through invalidate().
+'''
+
+
+class DeviceTreeCache(object):
+
+    def __init__(self):
+        self._values = {}
+        # entry key -> keys of the path it was resolved through
+        self._paths = {}
+        # path key -> entry keys resolved through it
+        self._dependents = {}
+        self._observers = {}
+        self._watching = {}
+        self._picked = {}
+        self._seen = set()
+        self._recording = False
+        self.hits = 0
+        self.misses = 0
+        self.one_offs = 0
+        self.invalidations = 0
+
+    def lookup(self, subject, resolve):
+        '''
+        Returns resolve(subject), computing it only if no valid entry exists.
+        '''
+        key = live_id(subject)
+        if key in self._values:
+            self.hits += 1
+            return self._values[key]
+
+        if key not in self._seen:
+            self._seen.add(key)
+            self.one_offs += 1
+            return resolve(subject)
+
+        self.misses += 1
+        self._recording = True
+        try:
+            value = resolve(subject)
+        finally:
+            self._recording = False
+            path = self._path()
+            watching = self._watching
+            self._watching = {}
+            self._picked = {}
+        self._values[key] = value
+        self._paths[key] = path
+        for dependency in path:
+            self._dependents.setdefault(dependency, set()).add(key)
+            if dependency in watching and dependency not in self._observers:
+                self._observe(dependency, *watching[dependency])
+        return value
+
+    def watch(self, subject, chains):
+        '''
+        Called by resolve for a rack, with the chains it read. The rack is
+        observed if it ends up on the picked path.
+        '''
+        if self._recording:
+            self._watching[live_id(subject)] = (subject, chains)
+
+    def pick(self, parent, subject):
+        '''
+        Called by resolve with the subject whose result parent returns;
+        parent None stands for the subject being looked up.
+        '''
+        if self._recording:
+            self._picked[None if parent is None else live_id(parent)] = live_id(subject)
+
+    def invalidate(self, subject):
+        '''
+        Drops subject's entry and every entry resolved through subject.
+        '''
+        self._invalidate(live_id(subject))
+
+    def clear(self):
+        for key in list(self._observers.keys()):
+            self._unobserve(key)
+        self._values = {}
+        self._paths = {}
+        self._dependents = {}
+        self._seen = set()
+
+    def __contains__(self, subject):
+        return live_id(subject) in self._values
+
+    def __len__(self):
+        return len(self._values)
+
+    def stats(self):
+        return {
+            'entries': len(self._values),
+            'hits': self.hits,
+            'misses': self.misses,
+            'one_offs': self.one_offs,
+            'invalidations': self.invalidations,
+        }
+
+    def describe(self):
+        lookups = self.hits + self.misses + self.one_offs
+        ratio = 100.0 * self.hits / lookups if lookups else 0.0
+        return 'entries=%d hits=%d misses=%d one-offs=%d (%.1f%% hit) invalidations=%d' % (
+            len(self._values), self.hits, self.misses, self.one_offs, ratio,
+            self.invalidations)
+
+    def _path(self):
+        path = []
+        key = self._picked.get(None)
+        while key is not None and key not in path:
+            path.append(key)
+            key = self._picked.get(key)
+        return path
+
+    def _drop(self, key):
+        self._values.pop(key, None)
+        self._seen.discard(key)
+        for dependency in self._paths.pop(key, ()):
+            dependents = self._dependents.get(dependency)
+            if dependents is None:
+                continue
+            dependents.discard(key)
+            if not dependents:
+                del self._dependents[dependency]
+                self._unobserve(dependency)
+
+    def _observe(self, key, device, chains):
+        callback = lambda: self._invalidate(key)
+        observers = [(device, 'chains', callback)]
+        for chain in chains:
+            observers.append((chain, 'devices', callback))
+        for subject, prop, listener in observers:
+            getattr(subject, 'add_%s_listener' % prop)(listener)
+        self._observers[key] = observers
+
+    def _unobserve(self, key):
+        for subject, prop, listener in self._observers.pop(key, ()):
+            if getattr(subject, '%s_has_listener' % prop)(listener):
+                getattr(subject, 'remove_%s_listener' % prop)(listener)
+
+    def _invalidate(self, key):
+        self.invalidations += 1
+        self._drop(key)
+        for entry in list(self._dependents.get(key, ())):
+            self._drop(entry)
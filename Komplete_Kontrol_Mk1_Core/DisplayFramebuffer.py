@@ -0,0 +1,132 @@
+from KeyedTasks import TickTask
+
+from SysEx import DISPLAY_WIDTH, DISPLAY_GRIDS
+
+'''
+Framebuffer for the keyboard's four 28 character display grids.
+
+write() only updates the buffer and marks the grid dirty; a task running
+while there is something to show sends the dirty grids, so several writes
+to a grid within a tick cost one SysEx. Sends are spaced at least
+FLUSH_INTERVAL ticks apart. Text longer than a grid scrolls one character
+every SCROLL_INTERVAL ticks, pausing SCROLL_PAUSE ticks at either end.
+
+Grids are the unit of the display SysEx, so they are also the dirty
+regions.
+'''
+
+FLUSH_INTERVAL = 2
+SCROLL_INTERVAL = 3
+SCROLL_PAUSE = 10
+
+
+class _Grid(object):
+
+    def __init__(self):
+        self.text = ''
+        self.frame = None
+        self.sent = None
+        self.offset = 0
+        self.wait = 0
+
+    @property
+    def scrolls(self):
+        return len(self.text) > DISPLAY_WIDTH
+
+    def set_text(self, text):
+        self.text = text
+        self.offset = 0
+        self.wait = SCROLL_PAUSE
+        self.frame = text[:DISPLAY_WIDTH]
+
+    def advance(self):
+        '''Moves a scrolling grid on by one tick; True if its frame changed.'''
+        if self.wait > 0:
+            self.wait -= 1
+            return False
+        if self.offset >= len(self.text) - DISPLAY_WIDTH:
+            # Back to the start after the pause at the end
+            self.offset = 0
+            self.wait = SCROLL_PAUSE
+        else:
+            self.offset += 1
+            self.wait = SCROLL_PAUSE if self.offset >= len(self.text) - DISPLAY_WIDTH \
+                else SCROLL_INTERVAL - 1
+        self.frame = self.text[self.offset:self.offset + DISPLAY_WIDTH]
+        return True
+
+
+class DisplayFramebuffer(object):
+
+    def __init__(self, tasks, send):
+        '''send(grid, text) puts at most DISPLAY_WIDTH characters on grid.'''
+        self._send = send
+        self._grids = [_Grid() for _ in range(DISPLAY_GRIDS)]
+        self._dirty = set()
+        self._task = TickTask(tasks, self._tick)
+        self._idle_ticks = FLUSH_INTERVAL
+        self.writes = 0
+        self.flushes = 0
+
+    def write(self, grid, text):
+        grid = min(grid, DISPLAY_GRIDS - 1)
+        self.writes += 1
+        state = self._grids[grid]
+        if text == state.text:
+            return
+        state.set_text(text)
+        self._dirty.add(grid)
+        self._wake()
+
+    def text(self, grid):
+        return self._grids[min(grid, DISPLAY_GRIDS - 1)].text
+
+    def refresh(self):
+        '''Sends every grid again on the next flush.'''
+        for index, state in enumerate(self._grids):
+            state.sent = None
+            if state.frame is not None:
+                self._dirty.add(index)
+        if self._dirty:
+            self._wake()
+
+    def _wake(self):
+        self._task.schedule()
+
+    def _tick(self):
+        scrolling = False
+        for index, state in enumerate(self._grids):
+            if state.scrolls:
+                scrolling = True
+                if state.advance():
+                    self._dirty.add(index)
+        self._idle_ticks += 1
+        if self._dirty and self._idle_ticks >= FLUSH_INTERVAL:
+            self.flush()
+        # Ticking on until FLUSH_INTERVAL has passed lets the next write
+        # after a quiet spell go out on the following tick
+        if self._dirty or scrolling or self._idle_ticks < FLUSH_INTERVAL:
+            self._wake()
+
+    def flush(self):
+        dirty = self._dirty
+        self._dirty = set()
+        for index in sorted(dirty):
+            state = self._grids[index]
+            if state.frame != state.sent:
+                state.sent = state.frame
+                self.flushes += 1
+                self._send(index, state.frame)
+        self._idle_ticks = 0
+
+    def clear(self):
+        self._stop()
+        self._dirty = set()
+        self._grids = [_Grid() for _ in range(DISPLAY_GRIDS)]
+        self._idle_ticks = FLUSH_INTERVAL
+
+    def _stop(self):
+        self._task.cancel()
+
+    def describe(self):
+        return 'writes=%d sent=%d' % (self.writes, self.flushes)
@@ -0,0 +1,127 @@
+import Live
+
+from KeyedTasks import TickTask
+
+'''
+Coalesces encoder CC bursts into one parameter update per control surface
+tick, for encoders the script handles itself instead of leaving them to a
+Live MIDI mapping.
+
+Absolute encoders keep only the latest value of the tick. Relative encoders
+sum their deltas, and the sum is scaled by an acceleration factor that
+grows with the number of steps received in the tick, so a slow turn stays
+fine grained and a fast spin covers the whole range.
+'''
+
+MapMode = Live.MidiMap.MapMode
+
+# Steps a relative encoder needs to sweep a continuous parameter at the
+# slowest speed
+RELATIVE_STEPS = 127.0
+
+# Acceleration factor for n steps in one tick: 1 + ACCELERATION_GAIN * (n - 1),
+# capped at ACCELERATION_MAX. A gain of 0 turns acceleration off.
+ACCELERATION_GAIN = 0.5
+ACCELERATION_MAX = 8.0
+
+_SIGNED_BIT_MODES = (MapMode.relative_signed_bit,
+                     MapMode.relative_smooth_signed_bit)
+_SIGNED_BIT2_MODES = (MapMode.relative_signed_bit2,
+                      MapMode.relative_smooth_signed_bit2)
+_BINARY_OFFSET_MODES = (MapMode.relative_binary_offset,
+                        MapMode.relative_smooth_binary_offset)
+_TWO_COMPLIMENT_MODES = (MapMode.relative_two_compliment,
+                         MapMode.relative_smooth_two_compliment)
+RELATIVE_MODES = (_SIGNED_BIT_MODES + _SIGNED_BIT2_MODES +
+                  _BINARY_OFFSET_MODES + _TWO_COMPLIMENT_MODES)
+
+
+def is_relative(map_mode):
+    return map_mode in RELATIVE_MODES
+
+
+def relative_delta(value, map_mode):
+    '''Signed step count encoded in a relative CC value.'''
+    if map_mode in _TWO_COMPLIMENT_MODES:
+        return value - 128 if value >= 64 else value
+    if map_mode in _BINARY_OFFSET_MODES:
+        return value - 64
+    if map_mode in _SIGNED_BIT_MODES:
+        return -(value & 63) if value & 64 else value
+    if map_mode in _SIGNED_BIT2_MODES:
+        return value & 63 if value & 64 else -value
+    return 0
+
+
+def acceleration(steps):
+    factor = 1.0 + ACCELERATION_GAIN * (steps - 1)
+    return min(max(factor, 1.0), ACCELERATION_MAX)
+
+
+def absolute_value(parameter, value):
+    '''Parameter value for an absolute CC value of 0 to 127.'''
+    span = parameter.max - parameter.min
+    result = parameter.min + span * value / 127.0
+    if parameter.is_quantized:
+        result = float(round(result))
+    return result
+
+
+def moved_value(parameter, steps, factor=1.0):
+    '''Parameter value after a relative move of steps, scaled by factor.'''
+    if parameter.is_quantized:
+        step = 1.0
+    else:
+        step = (parameter.max - parameter.min) / RELATIVE_STEPS
+    result = parameter.value + steps * factor * step
+    if parameter.is_quantized:
+        result = float(round(result))
+    return min(max(result, parameter.min), parameter.max)
+
+
+class EncoderCoalescer(object):
+
+    def __init__(self, tasks, apply):
+        self._apply = apply
+        # index -> [map_mode, latest absolute value, summed delta, steps]
+        self._pending = {}
+        self._flush_task = TickTask(tasks, self.flush)
+        self.received = 0
+        self.applied = 0
+
+    def post(self, index, map_mode, value):
+        self.received += 1
+        pending = self._pending.get(index)
+        if pending is None:
+            pending = self._pending[index] = [map_mode, None, 0, 0]
+        if is_relative(map_mode):
+            delta = relative_delta(value, map_mode)
+            pending[2] += delta
+            pending[3] += abs(delta)
+        else:
+            pending[1] = value
+        self._flush_task.schedule()
+
+    def flush(self):
+        '''
+        Hands every pending encoder to the apply callback as (index, value,
+        delta): value is the latest absolute CC value or None, delta the
+        accelerated relative move or 0.
+        '''
+        self._flush_task.cancel()
+        pending = self._pending
+        self._pending = {}
+        for index in sorted(pending):
+            map_mode, value, delta, steps = pending[index]
+            if value is None and not delta:
+                continue
+            self.applied += 1
+            self._apply(index, value, delta * acceleration(steps))
+
+    def clear(self):
+        self._pending = {}
+        self._flush_task.cancel()
+
+    def describe(self):
+        return 'received=%d applied=%d coalesced=%d' % (
+            self.received, self.applied, self.received - self.applied)
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+
+from KeyedTasks import TickTask
+
+'''
+Coalesces bursts of Live listener events into one update per control
+surface tick.
+
+Events are posted with a kind and a subject. Until the next tick each
+(kind, subject) pair is only remembered once; the flush then hands every
+pending pair to the process callback, kinds in the order given at
+construction and subjects in the order they first fired.
+'''
+
+KIND_TRACK_LIST = 'track_list'
+KIND_ARM = 'arm'
+KIND_DEVICES = 'devices'
+
+DEFAULT_KIND_ORDER = (KIND_TRACK_LIST, KIND_ARM, KIND_DEVICES)
+
+
+class EventCoalescer(object):
+
+    def __init__(self, tasks, process, kind_order=DEFAULT_KIND_ORDER):
+        self._process = process
+        self._kind_order = tuple(kind_order)
+        self._pending = {}
+        self._flush_task = TickTask(tasks, self.flush)
+        self.received = 0
+        self.processed = 0
+
+    def post(self, kind, key=None, subject=None):
+        self.received += 1
+        pending = self._pending.get(kind)
+        if pending is None:
+            pending = self._pending[kind] = OrderedDict()
+        if key not in pending:
+            pending[key] = subject
+        self._flush_task.schedule()
+
+    def is_pending(self, kind):
+        return bool(self._pending.get(kind))
+
+    def flush(self, kind=None):
+        '''
+        Processes everything pending, or only the given kind. Called by the
+        scheduled task on the next tick, or directly by code that needs the
+        pending state applied right away.
+        '''
+        if kind is not None:
+            kinds = (kind,)
+        else:
+            kinds = self._kind_order
+            self._flush_task.cancel()
+        for current in kinds:
+            pending = self._pending.pop(current, None)
+            if not pending:
+                continue
+            for subject in pending.values():
+                self.processed += 1
+                self._process(current, subject)
+        if not self._pending:
+            self._flush_task.cancel()
+
+    def clear(self):
+        self._pending = {}
+        self._flush_task.cancel()
+
+    def describe(self):
+        return 'received=%d processed=%d coalesced=%d' % (
+            self.received, self.processed, self.received - self.processed)
@@ -1,12 +1,24 @@
 from __future__ import with_statement
 
-import sys
-import socket
+import os
+import time
 import Live
 
 from _Framework.SubjectSlot import subject_slot
 from SimpleDeviceComponent import SimpleDeviceComponent
-from GUtil import debug_out, register_sender
+from OutputShadow import OutputShadow
+from EventCoalescer import EventCoalescer, KIND_ARM, KIND_DEVICES, KIND_TRACK_LIST
+import SongModel
+from TrackTagIndex import tags_for_name, TAG_MIDI_SOURCE, TAG_NEEDS_MIDI_SOURCE
+import Instrumentation
+from Instrumentation import instrumented
+from MidiCapture import MidiCapture, DIRECTION_IN, DIRECTION_OUT
+from SysEx import SysExCache, status_message, display_message, display_kind, KIND_STATUS
+from DisplayFramebuffer import DisplayFramebuffer
+from KeyedTasks import KeyedTasks
+from MixerBank import MixerBank, BANK_JUMP_STRIPS, BANK_JUMP_GROUP
+from OutputScheduler import OutputScheduler, PRIORITY_LED, PRIORITY_STATUS, PRIORITY_DISPLAY
+from GUtil import debug_out, info_out, warn_out, log_enabled, register_sender, live_id, PhaseTimer, LOG_DEBUG
 from _Generic import GenericScript
 from _Generic.SpecialMixerComponent import SpecialMixerComponent
 
@@ -29,6 +41,27 @@ DEVICE_ROLE_DAW = 'KOMPLETE_KONTROL_DAW'
 DEVICE_ROLE_MIDI_KEYBOARD = 'KOMPLETE_KONTROL_MIDI_KEYBOARD'
 IMPLICIT_ARM_IS_ARM_MODE = False
 
+# Startup only attaches listeners to the armed and selected tracks and
+# leaves the first instrument scan and the other tracks' listeners to the
+# following ticks, STARTUP_ATTACH_BATCH tracks per tick.
+DEFER_STARTUP_WORK = True
+STARTUP_ATTACH_BATCH = 64
+
+# Bytes of MIDI sent to the keyboard per tick at most (one message always
+# goes through), or None for no limit. See OutputScheduler.
+OUTPUT_BYTES_PER_TICK = 512
+
+# Directory to record every instance's MIDI traffic into (see MidiCapture and
+# bench/replay_capture.py), or None to only capture on request.
+MIDI_CAPTURE_DIR = None
+
+# Where broadcast() sends state messages (see BroadcastChannel)
+BROADCAST_ADDRESS = ('localhost', 60090)
+
+# Where the DAW instance streams track and arm state (see StateStream), e.g.
+# ('localhost', 60091), or None for no stream
+STATE_STREAM_ADDRESS = None
+
 GLOBAL_CHANNEL = 0
 
 BUTTON_STATE_OFF = 0
@@ -46,6 +79,9 @@ SID_TRANSPORT_STOP = 93
 SID_TRANSPORT_PLAY = 94
 SID_TRANSPORT_RECORD = 95
 SID_LAST = 112
+
+# KeyedTasks key of the pending controlled track activation
+ACTIVATION_KEY = 'activate'
 transport_control_switch_ids = {
     SID_TRANSPORT_LOOP: 'LOOP',
     SID_TRANSPORT_REWIND: 'REWIND',
@@ -55,7 +91,6 @@ transport_control_switch_ids = {
     SID_TRANSPORT_RECORD: 'RECORD',
 }
 
-PARAM_PREFIX = 'NIKB'
 PLUGIN_PREFIX = 'Komplete Kontrol'
 PLUGIN_CLASS_NAME_VST = 'PluginDevice'
 PLUGIN_CLASS_NAME_AU = 'AuPluginDevice'
@@ -66,105 +101,77 @@ VOLUME_CCS = tuple(range(31, 38))
 
 ABSOLUTE_MAP_MODE = Live.MidiMap.MapMode.absolute
 
+# Racks nested deeper than this are not searched for instruments
+MAX_RACK_DEPTH = 8
+
+# Map mode of the 8 encoders; set the Controller Editor pages to match.
+# Relative modes (e.g. Live.MidiMap.MapMode.relative_two_compliment) get
+# acceleration when SCRIPT_SIDE_ENCODERS is on.
+ENCODER_MAP_MODE = ABSOLUTE_MAP_MODE
+
+# Handle the encoders in the script instead of through Live's MIDI mapping,
+# writing at most one value per parameter per tick (see EncoderCoalescer)
+SCRIPT_SIDE_ENCODERS = False
+
+# CCs of the mixer bank buttons as (next, previous), or None for fixed
+# faders. With bank buttons the VOLUME_CCS faders are handled by the script
+# and a bank move only re-targets the faders whose track changed, without
+# a MIDI map rebuild (see MixerBank).
+MIXER_BANK_CCS = None
+
+# How the bank buttons move: BANK_JUMP_STRIPS by as many tracks as there
+# are faders, BANK_JUMP_GROUP to the previous or next group track, or a tag
+# from TRACK_TAG_MARKERS to the previous or next track carrying it.
+MIXER_BANK_JUMP = BANK_JUMP_STRIPS
 
-def log(message):
-    sys.stderr.write("LOG: " + str(message).encode("utf-8"))
+
+def log(message, *args):
+    info_out(message, *args)
 
 
 def device_info(device):
-    if device:
-        debug_out("  # " + str(device.name) + " Class: " + str(device.class_name)
-                  + " DisplayName: " + str(device.class_display_name) + " Type: " + str(device.type))
+    if device and log_enabled(LOG_DEBUG):
+        debug_out("  # %s Class: %s DisplayName: %s Type: %s", device.name,
+                  device.class_name, device.class_display_name, device.type)
 
 
-def vindexof(alist, element):
-    index = 0
-    for ele in alist:
-        if ele == element:
-            return index
-        index = index + 1
-    return None
+'''
+Arms track (default: the selected track) and disarms the other armed tracks.
+A track tagged [M] also arms the [MIDISRC] tracks. midi_sources,
+armed_tracks and needs_midi_source can be handed in from the track indexes;
+whatever is missing is found by scanning song.tracks.
+'''
 
 
-def arm_smart(song, track=None):
+def arm_smart(song, track=None, midi_sources=None, armed_tracks=None, needs_midi_source=None):
     if not track:
         track = song.view.selected_track
     if track and track.can_be_armed and not track.arm:
-        tracks = song.tracks
+        if midi_sources is None:
+            midi_sources = [songtrack for songtrack in song.tracks
+                            if TAG_MIDI_SOURCE in tags_for_name(songtrack.name)]
+        if armed_tracks is None:
+            armed_tracks = [songtrack for songtrack in song.tracks
+                            if songtrack.can_be_armed and songtrack.arm]
 
         # Determine if selected track requires a MIDI source
-        use_midi_src = False
-        if '[M]' in track.name:
-            use_midi_src = True
+        use_midi_src = needs_midi_source
+        if use_midi_src is None:
+            use_midi_src = TAG_NEEDS_MIDI_SOURCE in tags_for_name(track.name)
 
-        for songtrack in tracks:
-            # Detect and arm the MIDI source track
-            if use_midi_src and '[MIDISRC]' in songtrack.name:
+        # Detect and arm the MIDI source track
+        if use_midi_src:
+            for songtrack in midi_sources:
                 songtrack.arm = True
-            elif songtrack != track and songtrack and songtrack.can_be_armed and songtrack.arm:
+
+        for songtrack in armed_tracks:
+            if songtrack == track or (use_midi_src and songtrack in midi_sources):
+                continue
+            if songtrack.arm:
                 songtrack.arm = False
 
         track.arm = True
 
-# -------------------------------------------------------------------------------------------
-# TrackElement
-
-
-class TrackElement:
-
-    allow_activate_track = False
-
-    def __init__(self, index, track, receiver, *a, **k):
-        self.index = index
-        self.track = track
-
-        if receiver.device_role == DEVICE_ROLE_DAW:
-            if track.can_be_armed:
-                debug_out("Track can be armed: %s, %s" %
-                          (track.name, str(track)))
-                self.allow_activate_track = True
-                track.add_arm_listener(self._changed_arming)
-                track.add_implicit_arm_listener(self._changed_implicit_arming)
-            else:
-                debug_out("Track cannot be armed: %s, %s" %
-                          (track.name, str(track)))
-
-        track.add_devices_listener(self._changed_devices)
-
-        self.receiver = receiver
-
-    def _changed_implicit_arming(self):
-        debug_out("_changed_implicit_arming called on: %s, %s" %
-                  (self.track.name, str(self.track)))
-        self._handle_track_armed()
-
-    def _changed_arming(self):
-        debug_out(" _changed_arming() called")
-        self._handle_track_armed()
-
-    def _handle_track_armed(self):
-        if not self.track.arm and not self.track.implicit_arm:
-            self.receiver.deactivate_track(self.index, self.track)
-        elif self.allow_activate_track and \
-            (self.track.arm or (IMPLICIT_ARM_IS_ARM_MODE and
-                                (self.track.arm or self.track.implicit_arm))):
-            self.receiver.control_track(self.index, self.track)
-
-    def _changed_devices(self):
-        if self.allow_activate_track:
-            self.receiver.devices_changed(self.index, self.track)
-
-    def release(self):
-        if self.track and self.track.can_be_armed:
-            self.track.remove_arm_listener(self._changed_arming)
-            self.track.remove_implicit_arm_listener(
-                self._changed_implicit_arming)
-        if self.track:
-            self.track.remove_devices_listener(self._changed_devices)
-        self.receiver = None
-        self.track = None
-
-
 # -------------------------------------------------------------------------------------------
 # FocusControl
 
@@ -172,16 +179,41 @@ class FocusControl(ControlSurface):
 
     controlled_track = None
 
+    # Devices resolved by find_instrument since startup
+    instrument_visits = 0
+
     def __init__(self, c_instance, device_role):
+        startup = PhaseTimer()
+        self._output_shadow = OutputShadow()
+        self._capture = None
+        self._broadcast = None
+        if MIDI_CAPTURE_DIR:
+            self.start_capture(os.path.join(MIDI_CAPTURE_DIR, '%s-%s.kkcap' % (
+                device_role, time.strftime('%Y%m%d-%H%M%S'))))
         super(FocusControl, self).__init__(c_instance)
+        startup.mark('framework')
+        self._output = OutputScheduler(self._tasks, self._write_midi, OUTPUT_BYTES_PER_TICK)
+        self._events = EventCoalescer(self._tasks, self._process_event)
+        self._activation = KeyedTasks(self._tasks)
         self.song().add_is_playing_listener(self.__update_play_button_led)
         self.device_role = device_role
+        self._midi_dispatch = self._build_midi_dispatch()
+        self._forward_midi = super(FocusControl, self).receive_midi
 
         register_sender(self)  # For Debug Output only
 
-        debug_out(str(dir(self)))
+        if log_enabled(LOG_DEBUG):
+            debug_out(str(dir(self)))
         self._active = False
-        self._tracks = []
+        self._model = SongModel.acquire(self.song(), self)
+        self._sysex_cache = SysExCache()
+        self._display = DisplayFramebuffer(self._tasks, self._send_display_grid)
+        self._state_stream = None
+        if STATE_STREAM_ADDRESS and device_role == DEVICE_ROLE_DAW:
+            self._start_state_stream()
+        self._deferring_startup = DEFER_STARTUP_WORK
+        self._deferred_startup = None
+        self._mixer_bank = None
         self.rewind_button_down = False
         self.forward_button_down = False
 
@@ -194,7 +226,7 @@ class FocusControl(ControlSurface):
             device.name = 'Device_Component'
             self.set_up_encoders(device)
             self.set_up_mixer_component(
-                VOLUME_CCS, (), {
+                () if MIXER_BANK_CCS else VOLUME_CCS, (), {
                     'NUMSENDS': 0,
                     'MASTERVOLUME': MASTER_VOLUME_CC,
                     'NOTOGGLE': 0
@@ -203,6 +235,7 @@ class FocusControl(ControlSurface):
 
             self._on_selected_track_changed()
             self.set_up_controls()
+            self.set_up_mixer_bank()
             self.request_rebuild_midi_map()
 
             self._set_suppress_rebuild_requests(False)
@@ -225,60 +258,173 @@ class FocusControl(ControlSurface):
                     False, MIDI_NOTE_TYPE, 0, SID_TRANSPORT_LOOP))
                 # self.transport.set_overdub_button(ButtonElement(
                 #     False, MIDI_NOTE_TYPE, 0, SID_TRANSPORT_LOOP))
+        startup.mark('components')
+
+        # The second instance finds the tracks already assigned
+        if not self._model.sync(self._deferring_startup):
+            self.tracks_reassigned()
+        self._deferring_startup = self._deferring_startup and self._model.deferring
+        startup.mark('tracks')
+        if self._deferring_startup:
+            self._tasks.add(Task.run(self._finish_startup))
+        else:
+            self._show_controlled_track()
+            startup.mark('instrument scan')
 
-        self._assign_tracks()
+        self.refresh_state()
+        startup.mark('refresh')
+        info_out("Startup (%s, %d tracks, %d deferred): %s",
+                 device_role, len(self._model.tracks), len(self._model.unattached),
+                 startup.describe())
+
+    def _show_controlled_track(self):
         ctrack = self.get_controlled_track()
         if ctrack:
             track = ctrack[0]
             instr = ctrack[1]
             self.controlled_track = track
-            index = list(self.song().tracks).index(track)
+            index = self._track_index(track)
             self.update_status_midi(index, track, instr, 1)
 
-        self.refresh_state()
+    '''
+    Deferred startup: the first tick scans for the controlled track's
+    instrument, then the remaining tracks get their listeners in batches.
+    '''
+
+    def _finish_startup(self):
+        self._deferred_startup = PhaseTimer()
+        self._show_controlled_track()
+        self._deferred_startup.mark('instrument scan')
+        self._attach_startup_batch()
+
+    def _attach_startup_batch(self):
+        self.attach_pending_tracks(STARTUP_ATTACH_BATCH)
+        if self._model.unattached:
+            self._tasks.add(Task.run(self._attach_startup_batch))
+            return
+        self._deferring_startup = False
+        if self._deferred_startup is not None:
+            self._deferred_startup.mark('listeners')
+            info_out("Deferred startup (%s): %s", self.device_role,
+                     self._deferred_startup.describe())
+            self._deferred_startup = None
+
+    '''
+    Attaches listeners to up to limit (default all) tracks whose listeners
+    were deferred at startup. Anything about to act on arbitrary tracks,
+    like arrow navigation, attaches all of them first.
+    '''
+
+    def attach_pending_tracks(self, limit=None):
+        return self._model.attach_pending_tracks(limit)
+
+    '''
+    Resends everything the keyboard should be showing, bypassing the
+    output shadow and SysEx caches.
+    '''
 
     def refresh_state(self):
+        self._sysex_cache.reset()
+        self._display.refresh()
+        known_state = self._output_shadow.messages()
+        self._output_shadow.reset()
+        for midi_bytes in known_state:
+            self._send_midi(midi_bytes)
         self.__update_play_button_led()
 
+    '''
+    Short note / CC messages are diffed against the output shadow so only
+    real LED changes reach the keyboard. Everything then goes through the
+    output scheduler, where LED feedback has the highest priority.
+    '''
+
+    def _send_midi(self, midi_event_bytes, *a, **k):
+        return self._send_prioritised(midi_event_bytes, PRIORITY_LED)
+
+    def _send_prioritised(self, midi_event_bytes, priority, key=None):
+        if not self._output_shadow.changed(midi_event_bytes):
+            return True
+        if self._suppress_send_midi:
+            self._output_shadow.forget(midi_event_bytes)
+            return False
+        return self._output.submit(midi_event_bytes, priority, key)
+
+    def _write_midi(self, midi_event_bytes):
+        sent = super(FocusControl, self)._send_midi(midi_event_bytes)
+        if self._suppress_send_midi:
+            self._output_shadow.forget(midi_event_bytes)
+        elif self._capture is not None:
+            self._capture.record(DIRECTION_OUT, midi_event_bytes)
+        return sent
+
+    '''
+    Records all MIDI received and sent from now on to path, until
+    stop_capture() or disconnect.
+    '''
+
+    def start_capture(self, path):
+        self.stop_capture()
+        try:
+            self._capture = MidiCapture(path)
+        except (IOError, OSError) as e:
+            warn_out("Could not start MIDI capture to %s: %s", path, e)
+            return False
+        info_out("Capturing MIDI to %s", path)
+        return True
+
+    def stop_capture(self):
+        if self._capture is not None:
+            info_out("MIDI capture stopped, %d messages in %s",
+                     self._capture.records, self._capture.path)
+            self._capture.close()
+            self._capture = None
+
+    @instrumented('FocusControl.receive_midi')
     def receive_midi(self, midi_bytes):
-        midi_status = midi_bytes[0] & 240
-        debug_out("receive_midi() called: %s (note_on=%s, note_off=%s)" % (
-            str(midi_status), MIDI_NOTE_ON_STATUS, MIDI_NOTE_OFF_STATUS))
-        if midi_status == MIDI_NOTE_ON_STATUS or midi_status == MIDI_NOTE_OFF_STATUS:
-            note = midi_bytes[1]
-            value = BUTTON_PRESSED if midi_bytes[2] > 0 else BUTTON_RELEASED
-            debug_out("midi note received: note=%s, value=%s" %
-                      (note, value))
-            if note in transport_control_switch_ids:
-                if self.device_role == DEVICE_ROLE_DAW:
-                    debug_out("transport received: note=%s, value=%s, transport=%s" % (
-                        note, value, transport_control_switch_ids[note]))
-                    self.handle_transport_switch_ids(note, value)
-                else:
-                    debug_out("transport ignored: note=%s, value=%s, transport=%s" % (
-                        note, value, transport_control_switch_ids[note]))
-                    return
-
-        super(FocusControl, self).receive_midi(midi_bytes)
-
-    def handle_transport_switch_ids(self, switch_id, value):
-        #debug_out("handle_transport_switch_ids() called. switch_id: " + str(switch_id) + " value: " + str(value))
-        if switch_id == SID_TRANSPORT_REWIND:
-            if value == BUTTON_PRESSED:
-                self.rewind_button_down = True
-            elif value == BUTTON_RELEASED:
-                self.rewind_button_down = False
-            self.__update_forward_rewind_leds()
-
-        elif switch_id == SID_TRANSPORT_FAST_FORWARD:
-            if value == BUTTON_PRESSED:
-                self.forward_button_down = True
-            elif value == BUTTON_RELEASED:
-                self.forward_button_down = False
-            self.__update_forward_rewind_leds()
-
-        elif self.device_role == DEVICE_ROLE_DAW and switch_id == SID_TRANSPORT_STOP and value == BUTTON_PRESSED:
-            self.__stop_song()
+        if self._capture is not None:
+            self._capture.record(DIRECTION_IN, midi_bytes)
+        handler = self._midi_dispatch.get(midi_bytes[:2])
+        if handler is None or handler(midi_bytes):
+            self._forward_midi(midi_bytes)
+
+    '''
+    receive_midi looks every message up by its first two bytes, (status,
+    note), in a table built once for the device role. Handlers return True
+    to pass the message on to the framework; messages without an entry go
+    straight there.
+    '''
+
+    def _build_midi_dispatch(self):
+        if self.device_role == DEVICE_ROLE_DAW:
+            handlers = {
+                SID_TRANSPORT_REWIND: self._on_rewind_switch,
+                SID_TRANSPORT_FAST_FORWARD: self._on_fast_forward_switch,
+            }
+        else:
+            # The transport belongs to the DAW instance
+            handlers = dict((note, self._ignore_transport_switch)
+                            for note in transport_control_switch_ids)
+        dispatch = {}
+        for channel in range(16):
+            for status in (MIDI_NOTE_ON_STATUS, MIDI_NOTE_OFF_STATUS):
+                for note, handler in handlers.items():
+                    dispatch[(status | channel, note)] = handler
+        return dispatch
+
+    def _on_rewind_switch(self, midi_bytes):
+        self.rewind_button_down = midi_bytes[2] > 0
+        self.__update_forward_rewind_leds()
+        return True
+
+    def _on_fast_forward_switch(self, midi_bytes):
+        self.forward_button_down = midi_bytes[2] > 0
+        self.__update_forward_rewind_leds()
+        return True
+
+    def _ignore_transport_switch(self, midi_bytes):
+        debug_out("transport ignored: note=%s, transport=%s",
+                  midi_bytes[1], transport_control_switch_ids[midi_bytes[1]])
+        return False
 
     def __stop_song(self):
         self.song().stop_playing()
@@ -332,16 +478,21 @@ class FocusControl(ControlSurface):
             channel = GLOBAL_CHANNEL
             if cc in range(128) and channel in range(16):
                 encoder = EncoderElement(
-                    MIDI_CC_TYPE, channel, cc, ABSOLUTE_MAP_MODE)
+                    MIDI_CC_TYPE, channel, cc, ENCODER_MAP_MODE)
                 encoder.name = 'Device_Parameter_' + \
                     str(list(encoder_ccs).index(cc)) + '_Control'
                 parameter_encoders.append(encoder)
-                log('Encoder: %s, CC: %s, channel: %s' %
-                    (encoder.name, cc, channel))
+                log('Encoder: %s, CC: %s, channel: %s',
+                    encoder.name, cc, channel)
 
         if len(parameter_encoders) > 0:
-            device.set_parameter_controls(tuple(parameter_encoders))
-            log('Initialized %s encoders' % len(parameter_encoders))
+            if SCRIPT_SIDE_ENCODERS:
+                device.set_script_parameter_controls(
+                    tuple(parameter_encoders), self._tasks)
+            else:
+                device.set_parameter_controls(tuple(parameter_encoders))
+            log('Initialized %s encoders%s', len(parameter_encoders),
+                ' (script side)' if SCRIPT_SIDE_ENCODERS else '')
 
     def set_up_mixer_component(self, volume_controls, trackarm_controls, mixer_options, global_channel, volume_map_mode):
         if volume_controls != None and trackarm_controls != None:
@@ -420,9 +571,99 @@ class FocusControl(ControlSurface):
 
                 strip.set_send_controls(tuple(send_controls))
 
+    '''
+    Script-side volume faders with bank buttons, when MIXER_BANK_CCS is set.
+    '''
+
+    def set_up_mixer_bank(self):
+        if not MIXER_BANK_CCS:
+            return
+        faders = []
+        for index, cc in enumerate(VOLUME_CCS):
+            fader = EncoderElement(
+                MIDI_CC_TYPE, GLOBAL_CHANNEL, cc, ABSOLUTE_MAP_MODE)
+            fader.name = str(index) + '_Volume_Control'
+            faders.append(fader)
+        anchors = None
+        if MIXER_BANK_JUMP is not BANK_JUMP_STRIPS:
+            anchors = self._mixer_bank_anchors
+        self._mixer_bank = MixerBank(
+            self._tasks, faders, lambda: self.song().visible_tracks, anchors)
+        self._mixer_bank.refresh()
+        # Folding a group changes visible_tracks without a tracks event
+        self.song().add_visible_tracks_listener(self._on_visible_tracks_changed)
+
+        next_cc, prev_cc = MIXER_BANK_CCS
+        self.next_bank_button = ButtonElement(
+            True, MIDI_CC_TYPE, GLOBAL_CHANNEL, next_cc)
+        self.prev_bank_button = ButtonElement(
+            True, MIDI_CC_TYPE, GLOBAL_CHANNEL, prev_cc)
+        self._do_next_bank.subject = self.next_bank_button
+        self._do_prev_bank.subject = self.prev_bank_button
+        log('Mixer bank: %s faders, bank CCs %s/%s, jump: %s',
+            len(faders), next_cc, prev_cc, MIXER_BANK_JUMP or 'strips')
+
+    '''
+    Indexes into tracks of the group tracks, or of the tracks carrying the
+    MIXER_BANK_JUMP tag, from the tag index.
+    '''
+
+    def _mixer_bank_anchors(self, tracks):
+        if MIXER_BANK_JUMP == BANK_JUMP_GROUP:
+            return [index for index, track in enumerate(tracks) if track.is_foldable]
+        if self._model.unattached:
+            self.attach_pending_tracks()
+        keys = set(live_id(element.track) for element in
+                   self._model.track_tags.tagged(MIXER_BANK_JUMP))
+        return [index for index, track in enumerate(tracks) if live_id(track) in keys]
+
+    def _on_visible_tracks_changed(self):
+        self._mixer_bank.refresh()
+
     @subject_slot('value')
-    def _do_stop(self):
-        self.__stop_song()
+    def _do_next_bank(self, value):
+        if value != 0:
+            self.move_mixer_bank(1)
+
+    @subject_slot('value')
+    def _do_prev_bank(self, value):
+        if value != 0:
+            self.move_mixer_bank(-1)
+
+    def move_mixer_bank(self, direction):
+        if self._events.is_pending(KIND_TRACK_LIST):
+            self._events.flush(KIND_TRACK_LIST)
+        bank = self._mixer_bank
+        if bank.move(direction):
+            self.show_message('Komplete Kontrol faders: tracks %d to %d (%.2f ms)' % (
+                bank.offset + 1, bank.offset + len(VOLUME_CCS),
+                bank.last_remap_seconds * 1000))
+
+    @subject_slot('value')
+    def _do_stop(self, value):
+        if not value:
+            return
+        if Instrumentation.ENABLED and self.rewind_button_down and self.forward_button_down:
+            self.dump_timings()
+        else:
+            self.__stop_song()
+
+    '''
+    Logs the hot path timing report and writes it to
+    Instrumentation.REPORT_PATH. Bound to STOP while REWIND and FAST FORWARD
+    are held, when instrumentation is enabled.
+    '''
+
+    def dump_timings(self):
+        for line in Instrumentation.report_lines(histograms=False):
+            info_out(line)
+        try:
+            path = Instrumentation.write_report()
+        except (IOError, OSError) as e:
+            warn_out("Could not write timing report: %s", e)
+            return
+        info_out("Timing report written to %s", path)
+        self.show_message('Komplete Kontrol timings written to ' + path)
 
     @subject_slot('value')
     def _do_left(self, value):
@@ -444,72 +685,71 @@ class FocusControl(ControlSurface):
     '''
 
     def navigate_midi_track(self, direction):
+        if self._events.is_pending(KIND_TRACK_LIST):
+            self._events.flush(KIND_TRACK_LIST)
+        if self._model.unattached:
+            self.attach_pending_tracks()
         song = self.song()
-        tracks = song.tracks
         seltrack = song.view.selected_track
-        index = vindexof(tracks, seltrack)
+        index = self._track_index(seltrack)
 
         # If the new selection isn't yet armed, arm that before
         # moving
         if not seltrack.arm:
-            arm_smart(song, song.view.selected_track)
+            self.arm_track_smart(song.view.selected_track)
             return
 
         # Replace with get_next_midi_track to select next available midi track
         # left or right
-        nxttrack = self.get_next_track(direction, index, tracks)
+        nxttrack = self.get_next_track(direction, index)
         if nxttrack:
             song.view.selected_track = nxttrack
-            arm_smart(song, nxttrack)
+            self.arm_track_smart(nxttrack)
         else:
-            arm_smart(song, seltrack)
+            self.arm_track_smart(seltrack)
+
+    '''
+    arm_smart() fed from the tag and armed-track indexes: only the
+    [MIDISRC] tracks and the tracks that are actually armed are touched.
+    '''
+
+    def arm_track_smart(self, track):
+        if self._model.unattached:
+            self.attach_pending_tracks()
+        key = live_id(track)
+        if key not in self._model.elements:
+            arm_smart(self.song(), track)
+            return
+        arm_smart(self.song(), track,
+                  midi_sources=[element.track for element in
+                                self._model.track_tags.tagged(TAG_MIDI_SOURCE)],
+                  armed_tracks=[element.track for element in
+                                self.armed_elements()],
+                  needs_midi_source=self._model.track_tags.has_tag(
+                      key, TAG_NEEDS_MIDI_SOURCE))
 
     '''
     Selects next available armable Track. Values for direction are -1 going left
-    and -1 for going left.
+    and 1 going right; an index of None means past the last track.
     '''
 
-    def get_next_track(self, direction, index, tracks):
-        pos = index
-        if pos == None:
-            pos = len(tracks)
-        pos = pos + direction
-        while pos >= 0 and pos < len(tracks):
-            track = tracks[pos]
-            if track.can_be_armed:
-                return track
-            pos = pos + direction
-        return None
+    def get_next_track(self, direction, index):
+        return self._model.track_at(self._model.navigation.armable.neighbour(index, direction))
 
     '''
     Selects next available MIDI Track. Values for direction are -1 going left
-    and -1 for going left.
+    and 1 going right; an index of None means past the last track.
     '''
 
-    def get_next_midi_track(self, direction, index, tracks):
-        pos = index
-        if pos == None:
-            pos = len(tracks)
-        pos = pos + direction
-        while pos >= 0 and pos < len(tracks):
-            track = tracks[pos]
-            # Looking for a special Device
-            if track.can_be_armed and track.has_midi_input:
-                return track
-            pos = pos + direction
-        return None
+    def get_next_midi_track(self, direction, index):
+        return self._model.track_at(self._model.navigation.midi.neighbour(index, direction))
 
     '''
     Returns tuple (track, (device [,Instance No]))
     '''
 
     def get_controlled_track(self):
-        armed_tracks = []
-        tracks = self.song().tracks
-
-        for track in tracks:
-            if track.can_be_armed and (track.arm or track.implicit_arm):
-                armed_tracks.append(track)
+        armed_tracks = [element.track for element in self.armed_elements()]
 
         # if len(armed_tracks) == 1:
         # return (armed_tracks[0],
@@ -526,59 +766,80 @@ class FocusControl(ControlSurface):
 
     def find_instrument_ni(self, tracks):
         for track in tracks:
-            instr = self.find_instrument_list(track.devices)
+            instr = self.find_track_instrument(track)
             if instr and instr[1] is not None:
                 return (track, instr)
         return None
 
     def find_instrument_any(self, tracks):
         for track in tracks:
-            instr = self.find_instrument_list(track.devices)
+            instr = self.find_track_instrument(track)
             if instr:
                 return (track, instr)
         return None
 
+    '''
+    Reconciles the shared song model's TrackElements with song().tracks now,
+    whether or not its tracks listener has fired.
+    '''
+
     def _assign_tracks(self):
-        tracks = self.song().tracks
+        self._model.assign_tracks(self._deferring_startup)
 
-        for track in self._tracks:
-            track.release()
+    '''
+    Called by the song model after its tracks were reassigned, for every
+    instance subscribed to it.
+    '''
+
+    def tracks_reassigned(self):
+        if self._state_stream is not None:
+            self._state_stream.track_list(self._model.elements)
 
-        self._tracks = []
+    def track_renamed(self, element):
+        if self._state_stream is not None:
+            self._state_stream.mark(live_id(element.track), element)
 
-        for index in range(len(tracks)):
-            self._tracks.append(TrackElement(index, tracks[index], self))
+    def armed_elements(self):
+        return self._model.armed_elements()
+
+    def _track_index(self, track):
+        return self._model.track_index(track)
+
+    '''
+    Activation is delayed by a tick and latest wins: a track armed while
+    another one's activation is still pending replaces it, so only the
+    final controlled track is armed and sends its status.
+    '''
 
     def control_track(self, index, track):
         if self.controlled_track != track:
             self.controlled_track = track
-            instr = self.find_instrument_list(track.devices)
-            debug_out("CONTROL_TRACK(): " +
-                      track.name + "   " + str(instr))
+            instr = self.find_track_instrument(track)
+            debug_out("CONTROL_TRACK(): %s   %s", track.name, instr)
             if track.implicit_arm and not track.arm:
                 debug_out("going to arm implicit_armed track")
 
-            run_task = Task.run(
-                lambda: self.activate_track(index, track, instr))
-            task_seq = Task.sequence(Task.delay(1), run_task)
-            self._tasks.add(task_seq)
+            self._activation.schedule(
+                ACTIVATION_KEY, lambda: self.activate_track(index, track, instr), 1)
         else:
-            debug_out("Not re-activating controlled track %s" % track.name)
+            debug_out("Not re-activating controlled track %s", track.name)
 
     def activate_track(self, index, track, instr):
         is_ni = instr is not None and instr[1] is not None
-        debug_out("ACTIVATE_TRACK(): %s %s (%s)" %
-                  (track.name, str(instr), "NI" if is_ni else "non-NI"))
+        debug_out("ACTIVATE_TRACK(): %s %s (%s)",
+                  track.name, instr, "NI" if is_ni else "non-NI")
         track.arm = True
         self.update_status_midi(index, track, instr, 1)
 
     def deactivate_track(self, index, track):
-        debug_out("DEACTIVATE_TRACK called: %s" % track.name)
+        debug_out("DEACTIVATE_TRACK called: %s", track.name)
         # instr = self.find_instrument_list(track.devices)
         # self.update_status_midi(index, track, instr, 0)
 
         if self.controlled_track and self.controlled_track == track:
             self.controlled_track = None
+            if self._activation.cancel(ACTIVATION_KEY):
+                debug_out("Cancelled pending activation of %s", track.name)
             debug_out("Releasing controlled Track")
 
             # # Reactivate another track is there were multiple ones armed
@@ -592,23 +853,66 @@ class FocusControl(ControlSurface):
             #     self.update_status_midi(index, track, instr, 1)
 
     def devices_changed(self, index, track):
-        debug_out(" DEVICES_CHANGED() Track " + str(index) + " " + track.name)
-        instr = self.find_instrument_list(track.devices)
+        debug_out(" DEVICES_CHANGED() Track %s %s", index, track.name)
+        instr = self.find_track_instrument(track)
         self.update_status_midi(index, track, instr, 1)
 
+    '''
+    Listener events are queued and handled at most once per kind and track
+    on the next tick, so a burst of devices or arm notifications (loading a
+    preset or rack) costs one instrument scan and one status update. Both
+    instances get every event from the song model; only the DAW role acts on
+    arm and devices changes.
+    '''
+
+    def post_track_event(self, kind, element):
+        if self.device_role == DEVICE_ROLE_DAW:
+            self._events.post(kind, id(element), element)
+
+    @instrumented('FocusControl._process_event')
+    def _process_event(self, kind, element):
+        if kind == KIND_TRACK_LIST:
+            self._update_track_list()
+        elif element.track is None:
+            # Released by a track list change since the event was posted
+            return
+        elif kind == KIND_ARM:
+            self._handle_track_armed(element)
+        elif kind == KIND_DEVICES:
+            self.devices_changed(element.index, element.track)
+        if self._state_stream is not None and kind != KIND_TRACK_LIST and element.track:
+            self._state_stream.mark(live_id(element.track), element)
+
+    @instrumented('FocusControl._handle_track_armed')
+    def _handle_track_armed(self, element):
+        arm = element.track.arm
+        implicit_arm = element.track.implicit_arm
+        if not arm and not implicit_arm:
+            self.deactivate_track(element.index, element.track)
+        elif arm or (IMPLICIT_ARM_IS_ARM_MODE and implicit_arm):
+            self.control_track(element.index, element.track)
+
+    @instrumented('FocusControl._on_track_list_changed')
     def _on_track_list_changed(self):
+        super(FocusControl, self)._on_track_list_changed()
+        self._events.post(KIND_TRACK_LIST)
+
+    @instrumented('FocusControl._update_track_list')
+    def _update_track_list(self):
         # This is called whenever the tracks are re-ordered, which we don't really need,
         # therefore i commented out self.update_status_midi() below. -kurt
-        super(FocusControl, self)._on_track_list_changed()
-        self._assign_tracks()
+        # Whichever instance gets here first reconciles the shared song model
+        self._model.sync()
+        if self._mixer_bank is not None:
+            self._mixer_bank.refresh()
         ctrack = self.get_controlled_track()
         if ctrack:
             track = ctrack[0]
             instr = ctrack[1]
-            debug_out("_ON_TRACK_LIST_CHANGED() called " + str(instr))
+            debug_out("_ON_TRACK_LIST_CHANGED() called %s", instr)
             if track != self.controlled_track:
                 self.controlled_track = track
-                index = list(self.song().tracks).index(track)
+                index = self._track_index(track)
                 debug_out(
                     "_ON_TRACK_LIST_CHANGED: current track is not controlled_track")
                 #self.update_status_midi(index, track, instr, 1)
@@ -616,6 +920,7 @@ class FocusControl(ControlSurface):
             debug_out(" No More Controlled Track")
             self.controlled_track = None
 
+    @instrumented('FocusControl._on_selected_track_changed')
     def _on_selected_track_changed(self):
         super(FocusControl, self)._on_selected_track_changed()
         self.set_controlled_track(self.song().view.selected_track)
@@ -632,87 +937,152 @@ class FocusControl(ControlSurface):
         # index = list(self.song().tracks).index(track)
         # self.update_status_midi(index, track, instr, 1)
 
-    def broadcast(self):
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        if not s:
-            debug_out(" Could Not open Socket ")
-        else:
-            try:
-                s.connect(('localhost', 60090))
-                s.sendall('Hello, world')
-                s.close()
-            except:
-                debug_out(" No Server ")
+    '''
+    Streams track and arm state to STATE_STREAM_ADDRESS: a snapshot on
+    every connect, deltas after that.
+    '''
+
+    def _start_state_stream(self):
+        from BroadcastChannel import BroadcastChannel
+        from StateStream import StateStream
+        channel = BroadcastChannel(*STATE_STREAM_ADDRESS)
+        self._state_stream = StateStream(self._tasks, channel, self._describe_stream_track)
+        self._state_stream_channel = channel
+        channel.on_connect = self._state_stream.snapshot
+        channel.start()
+
+    def _describe_stream_track(self, element):
+        track = element.track
+        instrument = None
+        if element.armed:
+            instrument = self.find_track_instrument(track)
+        return {
+            'name': track.name,
+            'arm': bool(element.can_be_armed and track.arm),
+            'implicit_arm': bool(element.can_be_armed and track.implicit_arm),
+            'instrument': instrument,
+        }
+
+    '''
+    Queues message for the external listener at BROADCAST_ADDRESS. The
+    channel and its sender thread are only set up on first use.
+    '''
+
+    def broadcast(self, message):
+        if self._broadcast is None:
+            from BroadcastChannel import BroadcastChannel
+            self._broadcast = BroadcastChannel(*BROADCAST_ADDRESS)
+            self._broadcast.start()
+        self._broadcast.send(message)
 
     @subject_slot('devices')
     def _on_devices_changed(self):
         #debug_out(" > Changed Device on selected Track ")
         self.scan_devices()
 
-    def find_instrument_list(self, devicelist):
+    '''
+    Cached find_instrument_list over the track's devices. Entries stay valid
+    until the track's devices, one of the racks leading to its instrument or
+    the instrument's instance ID change.
+    '''
+
+    def find_track_instrument(self, track):
+        return self._model.instrument_cache.lookup(
+            track, lambda t: self.find_instrument_list(t.devices, t))
+
+    @instrumented('FocusControl.find_instrument_list')
+    def find_instrument_list(self, devicelist, track=None):
         for device in devicelist:
-            instr = self.find_instrument(device)
+            instr = self.find_instrument(device, 0, track)
             if instr:
+                self._model.instrument_cache.pick(None, device)
                 return instr
         return None
 
-    def find_in_chain(self, chain):
-        devices_instr_pairs = []
+    '''
+    Returns (device, instr) for the chain: the first Komplete Kontrol device
+    with an instrument, else the first device with one, else (None, None).
+    The scan stops at the first Komplete Kontrol device, as nothing after
+    it can win.
+    '''
+
+    def find_in_chain(self, chain, depth=0, track=None):
+        first = (None, None)
         for device in chain.devices:
-            instr = self.find_instrument(device)
+            instr = self.find_instrument(device, depth, track)
             if instr:
-                debug_out("Found instrument. device=%s, instr=%s, chain=%s" % (
-                    device, instr, chain))
-                devices_instr_pairs.append((device, instr))
-
-        for (device, instr) in devices_instr_pairs:
-            if self.device_is_ni(device):
-                return (device, instr)
-
-        if len(devices_instr_pairs) > 0:
-            return devices_instr_pairs[0]
-
-        return (None, None)
+                debug_out("Found instrument. device=%s, instr=%s, chain=%s",
+                          device, instr, chain)
+                if self.device_is_ni(device):
+                    return (device, instr)
+                if first[1] is None:
+                    first = (device, instr)
+        return first
 
     def device_is_ni(self, device):
         return (device.class_name == PLUGIN_CLASS_NAME_VST or device.class_name == PLUGIN_CLASS_NAME_AU) and (device.class_display_name.startswith(PLUGIN_PREFIX))
 
-    def find_instrument(self, device):
-        debug_out("find_instrument() called. type=%s, name=%s, class_name=%s, class_display_name=%s, parameters=%s" % (
-            device.type, device.name, device.class_name, device.class_display_name, ','.join([p.name for p in device.parameters])))
+    '''
+    Instrument of device, depth racks down from the track. Every device is
+    resolved at most once: a rack's result is taken from the result of its
+    winning chain instead of resolving the winner again. Results are cached
+    per track by find_track_instrument, which observes the racks on the way
+    to the instrument with the chains read here. Instance IDs are cached
+    under track, for pruning when its devices change.
+    '''
+
+    def find_instrument(self, device, depth=0, track=None):
+        self.instrument_visits += 1
+        if log_enabled(LOG_DEBUG):
+            debug_out("find_instrument() called. type=%s, name=%s, class_name=%s, class_display_name=%s",
+                      device.type, device.name, device.class_name, device.class_display_name)
         if device.type == 1:
             debug_out("find_instrument() found device type 1")
             if device.can_have_chains:
+                if depth >= MAX_RACK_DEPTH:
+                    warn_out("Not looking into racks nested deeper than %d: %s",
+                             MAX_RACK_DEPTH, device.name)
+                    return (device.class_display_name, None)
+                cache = self._model.instrument_cache
                 chains = device.chains
-                device_instr_pairs = []
+                cache.watch(device, chains)
+                first = (None, None)
                 for chain in chains:
-                    (device, instr) = self.find_in_chain(chain)
+                    (chain_device, instr) = self.find_in_chain(chain, depth + 1, track)
                     if instr:
-                        if self.device_is_ni(device):
-                            return self.find_instrument(device)
+                        if self.device_is_ni(chain_device):
+                            cache.pick(device, chain_device)
+                            return instr
+                        if first[1] is None:
+                            first = (chain_device, instr)
 
-                        device_instr_pairs.append((device, instr))
-
-                if len(device_instr_pairs) > 0:
-                    return self.find_instrument(device_instr_pairs[0][0])
+                if first[1] is not None:
+                    cache.pick(device, first[0])
+                    return first[1]
 
             elif self.device_is_ni(device):
-                device_params = device.parameters
                 debug_out("find_instrument() found NI device")
-                if device_params and len(device_params) > 1:
-                    pn = device_params[1].name
-                    debug_out("device_params[1].name=%s" % (pn,))
-                    pnLen = len(pn)
-                    if pn.startswith(PARAM_PREFIX):
-                        #debug_out("pn[1] starts with " + PARAM_PREFIX + " and str(pn[4:pnLen]) = " + str(pn[4:pnLen]))
-                        return (str(device.class_display_name), str(pn[4:pnLen]))
-                else:
-                    debug_out(
-                        "insufficient device parameters. device attrs=%s" % str(dir(device)))
+                instance_id = self._model.instance_ids.instance_id(device, track)
+                if instance_id is not None:
+                    return (str(device.class_display_name), str(instance_id))
             return (device.class_display_name, None)
 
         return None
 
+    '''
+    Called by the song model when a Komplete Kontrol plugin's instance ID
+    changed, after dropping the cached instruments resolved through it. The
+    controlled track's status is sent again; the SysEx cache drops it if the
+    track's instrument did not change.
+    '''
+
+    def instance_id_changed(self, device):
+        track = self.controlled_track
+        if self.device_role != DEVICE_ROLE_DAW or track is None:
+            return
+        self.update_status_midi(self._track_index(track), track,
+                                self.find_track_instrument(track), 1)
+
     def scan_chain(self, chain):
         for device in chain.devices:
             self.scan_device(device)
@@ -731,39 +1101,43 @@ class FocusControl(ControlSurface):
             for chain in chains:
                 self.scan_chain(chain)
 
+    '''
+    SysEx updates go out only when they differ from the last message of the
+    same kind; refresh_state() forgets the last messages to force a resend.
+    '''
+
+    @instrumented('FocusControl.update_status_midi')
     def update_status_midi(self, index, track, instrument, value):
         #debug_out("UPDATE_STATUS(): track: "+track.name+" instr: "+str(instrument)+" value: "+str(value))
-        msgsysex = [240, 0, 0, 102, 20, 18, 0]
-        tr_name = track.name
-        for c in tr_name:
-            msgsysex.append(ord(c))
-        msgsysex.append(25)
-        ind_str = str(index)
-        for c in ind_str:
-            msgsysex.append(ord(c))
-        if instrument != None:
-            msgsysex.append(25)
-            for c in instrument[0]:
-                msgsysex.append(ord(c))
-            if instrument[1] != None:
-                msgsysex.append(25)
-                for c in instrument[1]:
-                    msgsysex.append(ord(c))
-        # msgsysex.append(25)
-        # msgsysex.append(value)
-        msgsysex.append(247)
-        self._send_midi(tuple(msgsysex))
+        msgsysex = status_message(index, track.name, instrument)
+        self._send_sysex(KIND_STATUS, msgsysex)
+        if self._state_stream is not None:
+            self._state_stream.focus(live_id(track), index, instrument)
+
+    '''
+    Shows text on one of the four display grids. Writes go through the
+    display framebuffer, which sends at most one update per grid and
+    flush, and scrolls text that does not fit.
+    '''
 
     def send_to_display(self, text, grid=0):
-        if(len(text) > 28):
-            text = text[:27]
+        self._display.write(grid, text)
+
+    def _send_display_grid(self, grid, text):
+        self._send_sysex(display_kind(grid), display_message(text, grid))
+
+    def _send_sysex(self, kind, msgsysex):
+        if self._suppress_send_midi:
+            return
+        if self._sysex_cache.changed(kind, msgsysex):
+            priority = PRIORITY_STATUS if kind == KIND_STATUS else PRIORITY_DISPLAY
+            self._send_prioritised(msgsysex, priority, kind)
+        else:
+            debug_out("SysEx unchanged, not resending: %s", kind)
 
-        msgsysex = [240, 0, 0, 102, 23, 18, min(grid, 3) * 28]
-        filled = text.ljust(28)  # 27 Characters
-        for c in filled:
-            msgsysex.append(ord(c))
-        msgsysex.append(247)
-        self._send_midi(tuple(msgsysex))
+    @instrumented('FocusControl.build_midi_map')
+    def build_midi_map(self, midi_map_handle):
+        super(FocusControl, self).build_midi_map(midi_map_handle)
 
     def scan_devices(self):
         song = self.song()
@@ -776,5 +1150,32 @@ class FocusControl(ControlSurface):
         self._active = False
         self._suppress_send_midi = True
         self.song().remove_is_playing_listener(self.__update_play_button_led)
+        debug_out("Listener events: " + self._events.describe())
+        debug_out("Track activations: " + self._activation.describe())
+        debug_out("Display: " + self._display.describe())
+        debug_out("MIDI output: " + self._output.describe())
+        if Instrumentation.ENABLED:
+            for line in Instrumentation.report_lines(histograms=False):
+                info_out(line)
+        self._events.clear()
+        self._activation.clear()
+        if self._mixer_bank is not None:
+            if self.song().visible_tracks_has_listener(self._on_visible_tracks_changed):
+                self.song().remove_visible_tracks_listener(self._on_visible_tracks_changed)
+            self._mixer_bank.disconnect()
+        self._display.clear()
+        self._output.clear()
+        SongModel.release(self._model, self)
         super(FocusControl, self).disconnect()
+        self.stop_capture()
+        if self._broadcast is not None:
+            self._broadcast.close()
+            debug_out("Broadcast: " + self._broadcast.describe())
+            self._broadcast = None
+        if self._state_stream is not None:
+            self._state_stream.clear()
+            self._state_stream_channel.close()
+            debug_out("State stream: %s, %s", self._state_stream.describe(),
+                      self._state_stream_channel.describe())
+            self._state_stream = None
         return None
@@ -1,13 +1,170 @@
+import sys
+import time
+from collections import deque
+
 import Live
 RecordingQuantization = Live.Song.RecordingQuantization
 
+# Severity levels, lowest first
+LOG_DEBUG = 10
+LOG_INFO = 20
+LOG_WARNING = 30
+LOG_ERROR = 40
+LOG_OFF = 100
+
+LOG_LEVEL_NAMES = {
+    LOG_DEBUG: 'DEBUG',
+    LOG_INFO: 'INFO',
+    LOG_WARNING: 'WARNING',
+    LOG_ERROR: 'ERROR',
+}
+
+DEFAULT_LOG_LEVEL = LOG_INFO
+DEFAULT_RING_LEVEL = LOG_INFO
+DEFAULT_RING_SIZE = 512
+
 #For Global Debug Output
 msg_sender = None
 
+# Messages at or above log_level go to Live's log; messages at or above
+# ring_level are kept (unformatted) in the ring buffer. Anything below both
+# is dropped before its arguments are ever formatted.
+log_level = DEFAULT_LOG_LEVEL
+ring_level = DEFAULT_RING_LEVEL
+log_threshold = min(log_level, ring_level)
+log_ring = deque(maxlen=DEFAULT_RING_SIZE)
+
+# Highest resolution wall clock available; time.time() is coarse on Windows
+# under Python 2
+if hasattr(time, 'perf_counter'):
+    timer = time.perf_counter
+elif sys.platform == 'win32':
+    timer = time.clock
+else:
+    timer = time.time
+
+
 def register_sender(sender):
     global msg_sender
     msg_sender = sender
 
-def debug_out(message):
-    msg_sender.log_message(message) 
 
+def _update_threshold():
+    global log_threshold
+    log_threshold = min(log_level, ring_level)
+
+
+def set_log_level(level):
+    global log_level
+    log_level = level
+    _update_threshold()
+
+
+def set_ring_level(level, size=None):
+    global ring_level, log_ring
+    ring_level = level
+    if size is not None and size != log_ring.maxlen:
+        log_ring = deque(log_ring, maxlen=size)
+    _update_threshold()
+
+
+def log_enabled(level):
+    '''
+    True if a message at level would be logged or buffered. Use it to guard
+    work that has to happen before debug_out is even called.
+    '''
+    return level >= log_threshold
+
+
+def format_message(message, args):
+    if not args:
+        return str(message)
+    try:
+        return str(message) % args
+    except Exception:
+        return '%s %r' % (message, args)
+
+
+def _write(text):
+    if msg_sender is not None:
+        msg_sender.log_message(text)
+    else:
+        sys.stderr.write('LOG: ' + text + '\n')
+
+
+def log_at(level, message, *args):
+    if level < log_threshold:
+        return
+    if level >= ring_level:
+        log_ring.append((time.time(), level, message, args))
+    if level >= log_level:
+        _write(format_message(message, args))
+
+
+def debug_out(message, *args):
+    if LOG_DEBUG >= log_threshold:
+        log_at(LOG_DEBUG, message, *args)
+
+
+def info_out(message, *args):
+    if LOG_INFO >= log_threshold:
+        log_at(LOG_INFO, message, *args)
+
+
+def warn_out(message, *args):
+    log_at(LOG_WARNING, message, *args)
+
+
+def error_out(message, *args):
+    log_at(LOG_ERROR, message, *args)
+
+
+def dump_log(clear=False):
+    '''
+    Formats the ring buffer, oldest first, and writes it to Live's log.
+    Returns the formatted lines.
+    '''
+    lines = []
+    for stamp, level, message, args in list(log_ring):
+        lines.append('%s.%03d %-7s %s' % (
+            time.strftime('%H:%M:%S', time.localtime(stamp)),
+            int(stamp * 1000) % 1000,
+            LOG_LEVEL_NAMES.get(level, level),
+            format_message(message, args)))
+    _write('---- log ring buffer: %d entries ----' % len(lines))
+    for line in lines:
+        _write(line)
+    if clear:
+        log_ring.clear()
+    return lines
+
+
+def live_id(obj):
+    # Live hands out a new Python proxy on every property access, so
+    # identity has to come from the wrapped object's pointer.
+    ptr = getattr(obj, '_live_ptr', None)
+    if ptr is None:
+        return id(obj)
+    return ptr
+
+
+class PhaseTimer(object):
+    '''Wall time of consecutive named phases, e.g. for a startup breakdown.'''
+
+    def __init__(self):
+        self.phases = []
+        self._start = self._last = timer()
+
+    def mark(self, phase):
+        '''Ends the current phase, naming it phase.'''
+        now = timer()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def total(self):
+        return self._last - self._start
+
+    def describe(self):
+        parts = ['%s %.1f ms' % (phase, seconds * 1000) for phase, seconds in self.phases]
+        parts.append('total %.1f ms' % (self.total() * 1000))
+        return ', '.join(parts)
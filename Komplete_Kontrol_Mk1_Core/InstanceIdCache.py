@@ -0,0 +1,141 @@
+from GUtil import debug_out, live_id
+
+'''
+Komplete Kontrol instance IDs by plugin device.
+
+The plugin publishes its instance ID as the name of its second parameter,
+prefixed ('NIKB01'). The parameter list is read once per device; after that
+a name listener on that one parameter keeps the ID current, and a
+parameters listener on the device starts over when the plugin's parameter
+list changes. changed(device) is called when a known device's ID changes.
+Entries are kept under the track they were looked up for, so a devices
+change only has to check that track's entries.
+'''
+
+PARAM_PREFIX = 'NIKB'
+
+
+class _Entry(object):
+
+    def __init__(self, device):
+        self.device = device
+        self.owner = None
+        self.parameter = None
+        self.instance_id = None
+        self.on_name = None
+        self.on_parameters = None
+
+
+class InstanceIdCache(object):
+
+    def __init__(self, changed=None, prefix=PARAM_PREFIX):
+        self._prefix = prefix
+        self._changed = changed
+        self._entries = {}
+        # owner key -> keys of the entries looked up for it
+        self._owned = {}
+        self.parameter_reads = 0
+        self.name_changes = 0
+
+    def instance_id(self, device, owner=None):
+        '''device's instance ID without the prefix, or None.'''
+        key = live_id(device)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._watch(key, device)
+            if entry is None:
+                return None
+        if owner is not None:
+            self._own(key, entry, live_id(owner))
+        return entry.instance_id
+
+    def _own(self, key, entry, owner):
+        if entry.owner == owner:
+            return
+        self._disown(key, entry)
+        entry.owner = owner
+        self._owned.setdefault(owner, set()).add(key)
+
+    def _disown(self, key, entry):
+        keys = self._owned.get(entry.owner)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._owned[entry.owner]
+        entry.owner = None
+
+    def _parse(self, name):
+        if name.startswith(self._prefix):
+            return name[len(self._prefix):]
+        return None
+
+    def _watch(self, key, device):
+        self.parameter_reads += 1
+        parameters = device.parameters
+        if not parameters or len(parameters) < 2:
+            debug_out("insufficient device parameters. device attrs=%s", dir(device))
+            return None
+        entry = _Entry(device)
+        entry.parameter = parameters[1]
+        entry.instance_id = self._parse(entry.parameter.name)
+        debug_out("device_params[1].name=%s", entry.parameter.name)
+        entry.on_name = lambda: self._name_changed(entry)
+        entry.on_parameters = lambda: self._parameters_changed(key)
+        entry.parameter.add_name_listener(entry.on_name)
+        device.add_parameters_listener(entry.on_parameters)
+        self._entries[key] = entry
+        return entry
+
+    def _name_changed(self, entry):
+        self.name_changes += 1
+        instance_id = self._parse(entry.parameter.name)
+        if instance_id != entry.instance_id:
+            entry.instance_id = instance_id
+            if self._changed is not None:
+                self._changed(entry.device)
+
+    def _parameters_changed(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        instance_id = entry.instance_id
+        owner = entry.owner
+        self._forget(key)
+        if self._changed is not None and self.instance_id(entry.device) != instance_id:
+            self._changed(entry.device)
+        if owner is not None and key in self._entries:
+            self._own(key, self._entries[key], owner)
+
+    def _forget(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._disown(key, entry)
+        if entry.parameter and entry.parameter.name_has_listener(entry.on_name):
+            entry.parameter.remove_name_listener(entry.on_name)
+        if entry.device and entry.device.parameters_has_listener(entry.on_parameters):
+            entry.device.remove_parameters_listener(entry.on_parameters)
+
+    def prune(self, owner=None):
+        '''
+        Drops the entries of devices Live has deleted, of owner's only if
+        given.
+        '''
+        if owner is None:
+            keys = list(self._entries.keys())
+        else:
+            keys = list(self._owned.get(live_id(owner), ()))
+        for key in keys:
+            if not self._entries[key].device:
+                self._forget(key)
+
+    def clear(self):
+        for key in list(self._entries.keys()):
+            self._forget(key)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def describe(self):
+        return 'devices=%d parameter reads=%d name changes=%d' % (
+            len(self._entries), self.parameter_reads, self.name_changes)
@@ -0,0 +1,123 @@
+import functools
+import os
+import time
+
+from GUtil import timer
+
+'''
+Opt-in call counts and latency histograms for the script's hot paths.
+
+Methods are wrapped with @instrumented(name) when the module is imported.
+With ENABLED left False the decorator hands back the undecorated function,
+so the instrumentation costs nothing unless it is switched on here before
+Live loads the script.
+'''
+
+ENABLED = False
+
+# Where FocusControl writes the report when STOP is pressed while REWIND and
+# FAST FORWARD are held
+REPORT_PATH = os.path.join(os.path.expanduser('~'), 'KompleteKontrolTimings.txt')
+
+# Power of two microsecond buckets: <1us, <2us, <4us ... the last one
+# collects everything from about 16 seconds up
+HISTOGRAM_BUCKETS = 25
+
+
+class HotPathStats(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+
+    def record(self, seconds):
+        self.calls += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        bucket = int(seconds * 1000000).bit_length()
+        if bucket >= HISTOGRAM_BUCKETS:
+            bucket = HISTOGRAM_BUCKETS - 1
+        self.histogram[bucket] += 1
+
+    def percentile(self, fraction):
+        '''Upper bound in microseconds of the bucket holding the percentile.'''
+        wanted = fraction * self.calls
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= wanted:
+                return 1 << bucket
+        return 0
+
+    def describe(self):
+        mean = self.total / self.calls * 1000000 if self.calls else 0.0
+        return '%-40s %8d calls %10.1f ms total %8.1f us mean  p50 <%d us  p99 <%d us  max %.1f us' % (
+            self.name, self.calls, self.total * 1000, mean,
+            self.percentile(0.5), self.percentile(0.99), self.max * 1000000)
+
+
+stats = {}
+
+
+def stats_for(name):
+    entry = stats.get(name)
+    if entry is None:
+        entry = stats[name] = HotPathStats(name)
+    return entry
+
+
+def instrumented(name):
+    '''Times every call of the decorated function under name, if ENABLED.'''
+    def decorate(func):
+        if not ENABLED:
+            return func
+        entry = stats_for(name)
+
+        @functools.wraps(func)
+        def timed_call(*a, **k):
+            start = timer()
+            try:
+                return func(*a, **k)
+            finally:
+                entry.record(timer() - start)
+        return timed_call
+    return decorate
+
+
+def reset():
+    for entry in stats.values():
+        entry.reset()
+
+
+def report_lines(histograms=True):
+    '''The report as text lines, busiest hot path first.'''
+    if not ENABLED:
+        return ['Instrumentation is disabled']
+    lines = []
+    for entry in sorted(stats.values(), key=lambda e: -e.total):
+        lines.append(entry.describe())
+        if not histograms:
+            continue
+        peak = max(entry.histogram) or 1
+        for bucket, count in enumerate(entry.histogram):
+            if count:
+                lines.append('    <%9d us %8d %s' % (
+                    1 << bucket, count, '#' * max(1, count * 40 // peak)))
+    return lines
+
+
+def write_report(path=None):
+    if path is None:
+        path = REPORT_PATH
+    with open(path, 'w') as report:
+        report.write('Komplete Kontrol timings, %s\n\n' % time.strftime('%Y-%m-%d %H:%M:%S'))
+        for line in report_lines():
+            report.write(line + '\n')
+    return path
@@ -0,0 +1,89 @@
+from _Framework import Task
+
+'''
+Tasks on the control surface's task group.
+
+TickTask runs a function on the next tick, once however often it was
+scheduled since. KeyedTasks runs delayed tasks by key, latest wins:
+scheduling a key again kills the task still pending for it, so of a quick
+succession of requests only the last one runs. Killed tasks are counted as
+superseded.
+'''
+
+
+class TickTask(object):
+
+    def __init__(self, tasks, func):
+        self._tasks = tasks
+        self._func = func
+        self._task = None
+
+    def schedule(self):
+        '''Runs func on the next tick, unless it is already scheduled.'''
+        if self._task is None:
+            self._task = self._tasks.add(Task.run(self._run))
+
+    def _run(self):
+        # Forgotten first, so func can schedule the next run
+        self._task = None
+        self._func()
+
+    @property
+    def pending(self):
+        return self._task is not None
+
+    def cancel(self):
+        if self._task is not None:
+            self._task.kill()
+            self._task = None
+
+
+class KeyedTasks(object):
+
+    def __init__(self, tasks):
+        self._tasks = tasks
+        self._pending = {}
+        self.scheduled = 0
+        self.superseded = 0
+        self.cancelled = 0
+        self.ran = 0
+
+    def schedule(self, key, func, delay=0):
+        '''Runs func after delay ticks unless key is scheduled or cancelled again.'''
+        if self._kill(key):
+            self.superseded += 1
+        self.scheduled += 1
+        task = Task.run(lambda: self._run(key, func))
+        if delay:
+            task = Task.sequence(Task.delay(delay), task)
+        self._pending[key] = self._tasks.add(task)
+
+    def _run(self, key, func):
+        del self._pending[key]
+        self.ran += 1
+        func()
+
+    def _kill(self, key):
+        task = self._pending.pop(key, None)
+        if task is None:
+            return False
+        task.kill()
+        return True
+
+    def cancel(self, key):
+        if self._kill(key):
+            self.cancelled += 1
+            return True
+        return False
+
+    def is_pending(self, key):
+        return key in self._pending
+
+    def clear(self):
+        for task in self._pending.values():
+            task.kill()
+        self._pending = {}
+
+    def describe(self):
+        return 'scheduled=%d ran=%d superseded=%d cancelled=%d' % (
+            self.scheduled, self.ran, self.superseded, self.cancelled)
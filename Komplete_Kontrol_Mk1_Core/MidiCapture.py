@@ -0,0 +1,61 @@
+import struct
+
+from GUtil import timer
+
+'''
+Records the MIDI going in and out of a FocusControl to a compact binary
+file, for replaying "laggy controls" reports offline.
+
+File layout: the MAGIC header, then one record per message:
+    uint64 microseconds since capture start
+    uint8  direction (DIRECTION_IN / DIRECTION_OUT)
+    uint16 message length
+    bytes  message
+all little endian.
+'''
+
+MAGIC = b'KKMIDICAP1\n'
+DIRECTION_IN = 0
+DIRECTION_OUT = 1
+
+_RECORD = struct.Struct('<QBH')
+
+
+class MidiCapture(object):
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self._start = timer()
+        self.records = 0
+
+    def record(self, direction, midi_bytes):
+        if self._file is None:
+            return
+        stamp = int((timer() - self._start) * 1000000)
+        data = bytearray(midi_bytes)
+        self._file.write(_RECORD.pack(stamp, direction, len(data)))
+        self._file.write(data)
+        self.records += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_capture(path):
+    '''Returns the records of a capture file as (microseconds, direction, bytes).'''
+    records = []
+    with open(path, 'rb') as capture:
+        if capture.read(len(MAGIC)) != MAGIC:
+            raise ValueError('Not a MIDI capture file: %s' % path)
+        while True:
+            header = capture.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                break
+            stamp, direction, length = _RECORD.unpack(header)
+            data = bytearray(capture.read(length))
+            records.append((stamp, direction, tuple(data)))
+    return records
@@ -0,0 +1,160 @@
+from EncoderCoalescer import EncoderCoalescer, absolute_value, moved_value
+from Instrumentation import instrumented
+from GUtil import debug_out, live_id, timer
+
+'''
+Bank switching for the volume faders without rebuilding Live's MIDI map.
+
+Live can only rebuild the whole MIDI map, so the faders are not mapped by
+Live: they are forwarded to the script, coalesced per tick like the
+script-side encoders, and written to the volume of the track their strip
+currently targets. A bank move only re-targets the strips whose track
+actually changed.
+
+Absolute faders pick up the volume of a newly targeted track: their values
+are ignored until the fader reaches or crosses the track's current volume,
+so a bank move does not make the volumes jump to the fader positions.
+
+Banks move by the number of strips, or jump between anchor tracks (group
+tracks, or tracks carrying a tag) when an anchors callback is given. Every
+remap is timed.
+'''
+
+# Bank jump modes, see FocusControl.MIXER_BANK_JUMP. Any other value is a
+# tag from TRACK_TAG_MARKERS.
+BANK_JUMP_STRIPS = None
+BANK_JUMP_GROUP = 'group'
+
+
+class MixerBank(object):
+
+    def __init__(self, tasks, controls, tracks, anchors=None):
+        '''
+        tracks() returns the tracks the bank moves over, anchors(tracks),
+        if given, the indexes into them that bank jumps stop at.
+        '''
+        self._tracks = tracks
+        self._anchors = anchors
+        self._coalescer = EncoderCoalescer(tasks, self._apply_fader)
+        self._controls = tuple(controls)
+        self._listeners = tuple(self._fader_listener(index, control.message_map_mode())
+                                for index, control in enumerate(self._controls))
+        for control, listener in zip(self._controls, self._listeners):
+            control.add_value_listener(listener)
+        self._targets = [None] * len(self._controls)
+        self._volumes = [None] * len(self._controls)
+        self._picked_up = [False] * len(self._controls)
+        self._positions = [None] * len(self._controls)
+        self.offset = 0
+        self.pickup_ignored = 0
+        self.remaps = 0
+        self.strips_remapped = 0
+        self.last_remap_seconds = 0.0
+        self.max_remap_seconds = 0.0
+        self.total_remap_seconds = 0.0
+
+    def _fader_listener(self, index, map_mode):
+        coalescer = self._coalescer
+        return lambda value: coalescer.post(index, map_mode, value)
+
+    def _apply_fader(self, index, value, delta):
+        volume = self._volumes[index]
+        if volume is None:
+            return
+        if value is None:
+            volume.value = moved_value(volume, delta)
+            return
+        target = absolute_value(volume, value)
+        if not self._picked_up[index]:
+            previous = self._positions[index]
+            self._positions[index] = target
+            if not self._picks_up(volume, previous, target):
+                self.pickup_ignored += 1
+                return
+            self._picked_up[index] = True
+        volume.value = target
+
+    '''
+    Whether a fader moving from previous to target (None right after a
+    remap) reaches the volume's current value: within one CC step of it, or
+    on its other side.
+    '''
+
+    def _picks_up(self, volume, previous, target):
+        current = volume.value
+        if abs(target - current) <= (volume.max - volume.min) / 127.0:
+            return True
+        return previous is not None and (previous - current) * (target - current) <= 0
+
+    def targets(self):
+        return tuple(self._targets)
+
+    def move(self, direction):
+        '''Moves one bank (or jump) left for -1, right for 1.'''
+        tracks = self._tracks()
+        offset = self.offset
+        if self._anchors is not None:
+            anchors = self._anchors(tracks)
+            if direction > 0:
+                offset = next((a for a in anchors if a > self.offset), offset)
+            else:
+                offset = next((a for a in reversed(anchors) if a < self.offset), offset)
+        elif direction > 0:
+            if offset + len(self._controls) < len(tracks):
+                offset += len(self._controls)
+        else:
+            offset = max(0, offset - len(self._controls))
+        if offset == self.offset:
+            return 0
+        self.offset = offset
+        return self.refresh(tracks)
+
+    @instrumented('MixerBank.refresh')
+    def refresh(self, tracks=None):
+        '''
+        Re-targets the strips whose track changed, after a bank move or a
+        track list change. Returns how many strips were remapped.
+        '''
+        start = timer()
+        if tracks is None:
+            tracks = self._tracks()
+        if self.offset >= len(tracks):
+            self.offset = max(0, len(tracks) - len(self._controls))
+        remapped = 0
+        for index in range(len(self._controls)):
+            position = self.offset + index
+            track = tracks[position] if position < len(tracks) else None
+            if live_id(track) != live_id(self._targets[index]):
+                self._targets[index] = track
+                self._volumes[index] = track.mixer_device.volume if track else None
+                self._picked_up[index] = False
+                self._positions[index] = None
+                remapped += 1
+        elapsed = timer() - start
+        self.remaps += 1
+        self.strips_remapped += remapped
+        self.last_remap_seconds = elapsed
+        self.total_remap_seconds += elapsed
+        if elapsed > self.max_remap_seconds:
+            self.max_remap_seconds = elapsed
+        debug_out("Mixer bank at %d: %d of %d strips remapped in %.3f ms",
+                  self.offset, remapped, len(self._controls), elapsed * 1000)
+        return remapped
+
+    def disconnect(self):
+        for control, listener in zip(self._controls, self._listeners):
+            if control.value_has_listener(listener):
+                control.remove_value_listener(listener)
+        debug_out("Mixer bank: %s, faders: %s", self.describe(),
+                  self._coalescer.describe())
+        self._coalescer.clear()
+        self._targets = [None] * len(self._controls)
+        self._volumes = [None] * len(self._controls)
+        self._picked_up = [False] * len(self._controls)
+        self._positions = [None] * len(self._controls)
+
+    def describe(self):
+        mean = self.total_remap_seconds / self.remaps if self.remaps else 0.0
+        return 'remaps=%d strips=%d last=%.3f mean=%.3f max=%.3f ms pickup ignored=%d' % (
+            self.remaps, self.strips_remapped, self.last_remap_seconds * 1000,
+            mean * 1000, self.max_remap_seconds * 1000, self.pickup_ignored)
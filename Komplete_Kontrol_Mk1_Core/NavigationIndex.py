@@ -0,0 +1,103 @@
+'''
+Precomputed prev/next links over track positions for arrow navigation.
+
+NeighbourLinks answers "nearest member before/after position i" in constant
+time for one class of tracks. Flipping a single track in or out of the
+class only rewrites the links in the gap around it; a track list change
+rebuilds the links from flags that are already known, without touching
+Live.
+'''
+
+
+class NeighbourLinks(object):
+
+    def __init__(self, flags=()):
+        self.rebuild(flags)
+
+    def rebuild(self, flags):
+        self._member = [bool(flag) for flag in flags]
+        size = len(self._member)
+        self._next = [None] * size
+        self._prev = [None] * size
+
+        following = None
+        for pos in range(size - 1, -1, -1):
+            self._next[pos] = following
+            if self._member[pos]:
+                following = pos
+        preceding = None
+        for pos in range(size):
+            self._prev[pos] = preceding
+            if self._member[pos]:
+                preceding = pos
+
+    def __len__(self):
+        return len(self._member)
+
+    def is_member(self, pos):
+        return self._member[pos]
+
+    def set_member(self, pos, flag):
+        flag = bool(flag)
+        if self._member[pos] == flag:
+            return
+        self._member[pos] = flag
+        before = self._prev[pos]
+        after = self._next[pos]
+        first = before if before is not None else 0
+        last = after if after is not None else len(self._member) - 1
+        for other in range(first, pos):
+            self._next[other] = pos if flag else after
+        for other in range(pos + 1, last + 1):
+            self._prev[other] = pos if flag else before
+
+    def neighbour(self, pos, direction):
+        '''
+        Nearest member strictly before (direction < 0) or after pos. A pos of
+        None stands for "past the end", like a selected return track.
+        '''
+        size = len(self._member)
+        if pos is None:
+            pos = size
+        if direction > 0:
+            if pos >= size:
+                return None
+            if pos < 0:
+                return self._first()
+            return self._next[pos]
+        if pos <= 0:
+            return None
+        if pos >= size:
+            return self._last()
+        return self._prev[pos]
+
+    def _first(self):
+        if not self._member:
+            return None
+        return 0 if self._member[0] else self._next[0]
+
+    def _last(self):
+        if not self._member:
+            return None
+        return len(self._member) - 1 if self._member[-1] else self._prev[-1]
+
+
+class NavigationIndex(object):
+    '''
+    Neighbour links over armable tracks and over armable tracks with MIDI
+    input, indexed by position in song().tracks.
+    '''
+
+    def __init__(self):
+        self.armable = NeighbourLinks()
+        self.midi = NeighbourLinks()
+
+    def rebuild(self, elements):
+        self.armable.rebuild([element.can_be_armed for element in elements])
+        self.midi.rebuild([element.can_be_armed and element.has_midi_input
+                           for element in elements])
+
+    def update(self, element):
+        if element.index < len(self.midi):
+            self.midi.set_member(element.index,
+                                 element.can_be_armed and element.has_midi_input)
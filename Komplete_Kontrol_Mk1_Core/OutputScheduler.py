@@ -0,0 +1,164 @@
+from collections import deque
+
+from KeyedTasks import TickTask
+
+from GUtil import timer
+
+'''
+Orders the MIDI going out to the keyboard by priority and spreads it over
+control surface ticks so bursts of SysEx cannot overrun the keyboard's USB
+endpoint or hold up LED feedback.
+
+Each tick may carry bytes_per_tick bytes. A message goes out right away
+when nothing of the same or a higher priority is queued and it fits the
+tick's budget; otherwise it waits for a later tick, where queued messages
+leave highest priority first. A tick always lets at least one message
+through, however long. Messages submitted with a key replace a queued
+message with the same key, so a SysEx superseded before it left is never
+sent.
+'''
+
+PRIORITY_LED = 0
+PRIORITY_STATUS = 1
+PRIORITY_DISPLAY = 2
+
+PRIORITY_NAMES = ('led', 'status', 'display')
+
+DEFAULT_BYTES_PER_TICK = 512
+
+
+class _QueueStats(object):
+
+    def __init__(self):
+        self.sent = 0
+        self.queued = 0
+        self.replaced = 0
+        self.max_depth = 0
+        self.waited = 0
+        self.wait_ticks = 0
+        self.max_wait_ticks = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record_wait(self, ticks, seconds):
+        self.waited += 1
+        self.wait_ticks += ticks
+        self.wait_seconds += seconds
+        if ticks > self.max_wait_ticks:
+            self.max_wait_ticks = ticks
+        if seconds > self.max_wait_seconds:
+            self.max_wait_seconds = seconds
+
+
+class OutputScheduler(object):
+
+    def __init__(self, tasks, send, bytes_per_tick=DEFAULT_BYTES_PER_TICK):
+        '''send(midi_bytes) writes one message to the keyboard.'''
+        self._send = send
+        self.bytes_per_tick = bytes_per_tick
+        # Per priority: deque of [midi_bytes, key, tick, time]
+        self._queues = tuple(deque() for _ in PRIORITY_NAMES)
+        self._stats = tuple(_QueueStats() for _ in PRIORITY_NAMES)
+        self._tick_task = TickTask(tasks, self._next_tick)
+        self._tick = 0
+        self._spent = 0
+        self._sent_this_tick = 0
+
+    def submit(self, midi_bytes, priority=PRIORITY_LED, key=None):
+        stats = self._stats[priority]
+        if not any(self._queues[:priority + 1]) and self._fits(len(midi_bytes)):
+            self._write(midi_bytes, stats)
+            return True
+        queue = self._queues[priority]
+        if key is not None:
+            for entry in queue:
+                if entry[1] == key:
+                    entry[0] = midi_bytes
+                    stats.replaced += 1
+                    return True
+        queue.append([midi_bytes, key, self._tick, timer()])
+        stats.queued += 1
+        if len(queue) > stats.max_depth:
+            stats.max_depth = len(queue)
+        self._schedule()
+        return True
+
+    def depth(self, priority=None):
+        if priority is None:
+            return sum(len(queue) for queue in self._queues)
+        return len(self._queues[priority])
+
+    def _fits(self, length):
+        if self.bytes_per_tick is None or self._sent_this_tick == 0:
+            return True
+        return self._spent + length <= self.bytes_per_tick
+
+    def _write(self, midi_bytes, stats):
+        self._spent += len(midi_bytes)
+        self._sent_this_tick += 1
+        stats.sent += 1
+        self._send(midi_bytes)
+        self._schedule()
+
+    def _schedule(self):
+        self._tick_task.schedule()
+
+    def _next_tick(self):
+        self._tick += 1
+        self._spent = 0
+        self._sent_this_tick = 0
+        self.drain()
+
+    def drain(self):
+        '''Sends queued messages, highest priority first, within the budget.'''
+        now = timer()
+        for queue, stats in zip(self._queues, self._stats):
+            while queue:
+                entry = queue[0]
+                if not self._fits(len(entry[0])):
+                    self._schedule()
+                    return
+                queue.popleft()
+                stats.record_wait(self._tick - entry[2], now - entry[3])
+                self._write(entry[0], stats)
+
+    def flush(self):
+        '''Sends everything queued now, ignoring the budget.'''
+        budget = self.bytes_per_tick
+        self.bytes_per_tick = None
+        try:
+            self.drain()
+        finally:
+            self.bytes_per_tick = budget
+
+    def clear(self):
+        for queue in self._queues:
+            queue.clear()
+        self._tick_task.cancel()
+
+    def stats(self):
+        '''Per priority name: sent, queued, replaced, depth and wait figures.'''
+        result = {}
+        for name, queue, stats in zip(PRIORITY_NAMES, self._queues, self._stats):
+            waited = stats.waited
+            result[name] = {
+                'sent': stats.sent,
+                'queued': stats.queued,
+                'replaced': stats.replaced,
+                'depth': len(queue),
+                'max_depth': stats.max_depth,
+                'mean_wait_ticks': float(stats.wait_ticks) / waited if waited else 0.0,
+                'max_wait_ticks': stats.max_wait_ticks,
+                'mean_wait_ms': stats.wait_seconds * 1000 / waited if waited else 0.0,
+                'max_wait_ms': stats.max_wait_seconds * 1000,
+            }
+        return result
+
+    def describe(self):
+        parts = []
+        for name, entry in sorted(self.stats().items(),
+                                  key=lambda item: PRIORITY_NAMES.index(item[0])):
+            parts.append('%s sent=%d queued=%d replaced=%d depth=%d/%d wait=%.1f/%d ticks' % (
+                name, entry['sent'], entry['queued'], entry['replaced'], entry['depth'],
+                entry['max_depth'], entry['mean_wait_ticks'], entry['max_wait_ticks']))
+        return '; '.join(parts)
@@ -0,0 +1,57 @@
+from _Framework.InputControlElement import MIDI_NOTE_ON_STATUS, MIDI_NOTE_OFF_STATUS, MIDI_CC_STATUS
+
+'''
+Controller side copy of every LED / note / CC value sent to the keyboard.
+
+changed() records outgoing short messages and tells whether they would
+actually change anything on the device, so repeated LED updates can be
+dropped. Note-off and note-on with velocity 0 are the same LED state.
+'''
+
+SHADOWED_STATUS = (MIDI_NOTE_ON_STATUS, MIDI_NOTE_OFF_STATUS, MIDI_CC_STATUS)
+
+
+class OutputShadow(object):
+
+    def __init__(self):
+        self._state = {}
+        self.passed = 0
+        self.dropped = 0
+
+    def changed(self, midi_bytes):
+        '''
+        True if midi_bytes must be sent. Messages that are not note or CC
+        messages always pass and are not recorded.
+        '''
+        if len(midi_bytes) != 3:
+            return True
+        status = midi_bytes[0]
+        kind = status & 240
+        if kind not in SHADOWED_STATUS:
+            return True
+        value = midi_bytes[2]
+        if kind == MIDI_NOTE_OFF_STATUS:
+            status = MIDI_NOTE_ON_STATUS + (status & 15)
+            value = 0
+        key = (status, midi_bytes[1])
+        if self._state.get(key) == value:
+            self.dropped += 1
+            return False
+        self._state[key] = value
+        self.passed += 1
+        return True
+
+    def forget(self, midi_bytes):
+        '''Undoes the record made for midi_bytes, e.g. when it was not sent.'''
+        status = midi_bytes[0]
+        if status & 240 == MIDI_NOTE_OFF_STATUS:
+            status = MIDI_NOTE_ON_STATUS + (status & 15)
+        self._state.pop((status, midi_bytes[1]), None)
+
+    def messages(self):
+        '''The current state as the short messages that would recreate it.'''
+        return [(status, identifier, value)
+                for (status, identifier), value in sorted(self._state.items())]
+
+    def reset(self):
+        self._state = {}
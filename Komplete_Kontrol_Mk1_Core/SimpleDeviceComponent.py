@@ -1,5 +1,7 @@
 from _Framework.DeviceComponent import DeviceComponent
 from _Framework.ChannelTranslationSelector import ChannelTranslationSelector
+from _Framework.SubjectSlot import subject_slot
+from EncoderCoalescer import EncoderCoalescer, absolute_value, moved_value
 from GUtil import debug_out
 
 '''
@@ -17,9 +19,83 @@ class SimpleDeviceComponent(DeviceComponent):
 
     __doc__ = ' Class representing a device in Live '
 
+    # update() may run before __init__ is done
+    _script_controls = ()
+
     def __init__(self, *args, **kwargs):
         super(SimpleDeviceComponent, self).__init__(*args, **kwargs)
         self._control_translation_selector = ChannelTranslationSelector(8)
+        self._script_controls = ()
+        self._script_listeners = ()
+        self._script_parameters = ()
+        self._encoder_coalescer = None
+
+    '''
+    Script-side encoder mode: instead of being mapped by Live, the controls
+    are forwarded to the script and their CCs coalesced per tick before the
+    parameters of the current bank (or best-of-bank) are written, the same
+    ones DeviceComponent would map.
+    '''
+
+    def set_script_parameter_controls(self, controls, tasks):
+        self._release_script_controls()
+        self._encoder_coalescer = EncoderCoalescer(tasks, self._apply_encoder)
+        listeners = []
+        for index, control in enumerate(controls):
+            listener = self._encoder_listener(index, control.message_map_mode())
+            control.add_value_listener(listener)
+            listeners.append(listener)
+        self._script_controls = tuple(controls)
+        self._script_listeners = tuple(listeners)
+        self._update_script_parameters()
+
+    def _encoder_listener(self, index, map_mode):
+        coalescer = self._encoder_coalescer
+        return lambda value: coalescer.post(index, map_mode, value)
+
+    def _update_script_parameters(self):
+        device = self.device()
+        if device is None or not self._script_controls:
+            self._script_parameters = ()
+            device = None
+        else:
+            bank = self._current_bank_details()[1]
+            self._script_parameters = tuple(bank)[:len(self._script_controls)]
+        if self._on_script_parameters_changed.subject != device:
+            self._on_script_parameters_changed.subject = device
+
+    @subject_slot('parameters')
+    def _on_script_parameters_changed(self):
+        # A reconfigured plugin hands out new parameter objects
+        self._update_script_parameters()
+
+    def update(self):
+        super(SimpleDeviceComponent, self).update()
+        if self._script_controls:
+            self._update_script_parameters()
+
+    def _apply_encoder(self, index, value, delta):
+        if index >= len(self._script_parameters):
+            return
+        parameter = self._script_parameters[index]
+        if parameter is None or not parameter.is_enabled:
+            return
+        if value is not None:
+            parameter.value = absolute_value(parameter, value)
+        else:
+            parameter.value = moved_value(parameter, delta)
+
+    def _release_script_controls(self):
+        for control, listener in zip(self._script_controls, self._script_listeners):
+            if control.value_has_listener(listener):
+                control.remove_value_listener(listener)
+        if self._encoder_coalescer is not None:
+            debug_out("Encoder CCs: %s", self._encoder_coalescer.describe())
+            self._encoder_coalescer.clear()
+        self._script_controls = ()
+        self._script_listeners = ()
+        self._script_parameters = ()
+        self._on_script_parameters_changed.subject = None
 
     def set_device(self, device):
         super(SimpleDeviceComponent, self).set_device(device)
@@ -31,5 +107,6 @@ class SimpleDeviceComponent(DeviceComponent):
             #    debug_out(" > " + str(p.name) + " : " + str(p.original_name))
 
     def disconnect(self):
+        self._release_script_controls()
         self._control_translation_selector.disconnect()
         super(SimpleDeviceComponent, self).disconnect()
@@ -0,0 +1,372 @@
+from collections import deque
+
+from DeviceTreeCache import DeviceTreeCache
+from InstanceIdCache import InstanceIdCache
+from NavigationIndex import NavigationIndex
+from TrackTagIndex import TrackTagIndex
+from EventCoalescer import KIND_ARM, KIND_DEVICES
+from Instrumentation import instrumented
+from GUtil import debug_out, live_id
+
+'''
+Process-wide model of a Live song, shared by the DAW and MIDI keyboard
+FocusControl instances.
+
+The model holds one TrackElement, and so one set of Live listeners, per
+track, the armed track, tag and navigation indexes, the instrument cache
+and the Komplete Kontrol instance IDs. Surfaces subscribe to the model of
+their song through acquire() and give it back with release(); the model is
+torn down with its last subscriber. Listener events are handled once here
+and then handed to every subscriber, which decides what its role does with
+them.
+'''
+
+# -------------------------------------------------------------------------------------------
+# TrackElement
+
+
+class TrackElement:
+
+    can_be_armed = False
+    has_midi_input = False
+
+    # Last seen arm or implicit_arm state, kept current by the arm listeners
+    armed = False
+
+    # Number of Live listeners this element currently holds
+    listener_count = 0
+
+    # Whether the Live listeners are in place, see attach()
+    attached = False
+
+    def __init__(self, index, track, receiver, attach=True, *a, **k):
+        self.index = index
+        self.track = track
+        self.receiver = receiver
+
+        if track.can_be_armed:
+            debug_out("Track can be armed: %s, %s", track.name, track)
+            self.can_be_armed = True
+            self.armed = bool(track.arm or track.implicit_arm)
+            self.has_midi_input = bool(track.has_midi_input)
+        else:
+            debug_out("Track cannot be armed: %s, %s", track.name, track)
+
+        if attach:
+            self.attach()
+
+    '''
+    Adds the Live listeners. With catch_up, changes made to the track since
+    the element was created are replayed, for elements whose listeners
+    were deferred at startup.
+    '''
+
+    def attach(self, catch_up=False):
+        track = self.track
+        if self.attached or track is None:
+            return
+        if self.can_be_armed:
+            track.add_arm_listener(self._changed_arming)
+            track.add_implicit_arm_listener(self._changed_implicit_arming)
+            track.add_has_midi_input_listener(self._changed_midi_input)
+            self.listener_count += 3
+        track.add_devices_listener(self._changed_devices)
+        track.add_name_listener(self._changed_name)
+        self.listener_count += 2
+        self.attached = True
+
+        if catch_up:
+            if self.can_be_armed:
+                if self.has_midi_input != bool(track.has_midi_input):
+                    self._changed_midi_input()
+                if self.armed != bool(track.arm or track.implicit_arm):
+                    self._changed_arm_state()
+            self.receiver.track_name_changed(self)
+            self.receiver.forget_track_devices(track)
+
+    @instrumented('TrackElement._changed_implicit_arming')
+    def _changed_implicit_arming(self):
+        debug_out("_changed_implicit_arming called on: %s, %s",
+                  self.track.name, self.track)
+        self._changed_arm_state()
+
+    @instrumented('TrackElement._changed_arming')
+    def _changed_arming(self):
+        debug_out(" _changed_arming() called")
+        self._changed_arm_state()
+
+    '''
+    The armed-track index is updated right away; acting on the change is
+    left to the subscribers, which coalesce it into one update per tick.
+    '''
+
+    def _changed_arm_state(self):
+        armed = bool(self.track.arm or self.track.implicit_arm)
+        if self.armed != armed:
+            self.armed = armed
+            self.receiver.track_arm_changed(self)
+        self.receiver.post_track_event(KIND_ARM, self)
+
+    @instrumented('TrackElement._changed_midi_input')
+    def _changed_midi_input(self):
+        self.has_midi_input = bool(self.track.has_midi_input)
+        self.receiver.track_midi_input_changed(self)
+
+    @instrumented('TrackElement._changed_name')
+    def _changed_name(self):
+        self.receiver.track_name_changed(self)
+
+    @instrumented('TrackElement._changed_devices')
+    def _changed_devices(self):
+        self.receiver.forget_track_devices(self.track)
+        # Tracks that cannot be armed never become the controlled track
+        if self.can_be_armed:
+            self.receiver.post_track_event(KIND_DEVICES, self)
+
+    '''
+    Removes this element's listeners and returns how many were removed.
+    '''
+
+    def release(self):
+        removed = self.listener_count
+        if self.track and self.attached and self.can_be_armed:
+            self.track.remove_arm_listener(self._changed_arming)
+            self.track.remove_implicit_arm_listener(
+                self._changed_implicit_arming)
+            self.track.remove_has_midi_input_listener(
+                self._changed_midi_input)
+        if self.track and self.attached:
+            self.track.remove_devices_listener(self._changed_devices)
+            self.track.remove_name_listener(self._changed_name)
+        self.listener_count = 0
+        self.attached = False
+        self.receiver = None
+        self.track = None
+        return removed
+
+
+# -------------------------------------------------------------------------------------------
+# SongModel
+
+
+class SongModel(object):
+
+    # Listener (added, removed) counts for the last track list change and
+    # since the model was created
+    listener_ops = (0, 0)
+    listener_ops_total = (0, 0)
+
+    def __init__(self, song):
+        self.song = song
+        self.tracks = []
+        self.elements = {}
+        self.track_tags = TrackTagIndex()
+        self.navigation = NavigationIndex()
+        self.instrument_cache = DeviceTreeCache()
+        self.instance_ids = InstanceIdCache(self._instance_id_changed)
+        self.unattached = deque()
+        self.deferring = False
+        self._armed = {}
+        self._subscribers = []
+        self._tracks_changed = True
+        song.add_tracks_listener(self._on_tracks_changed)
+
+    @property
+    def subscribers(self):
+        return tuple(self._subscribers)
+
+    def subscribe(self, surface):
+        if surface not in self._subscribers:
+            self._subscribers.append(surface)
+
+    def unsubscribe(self, surface):
+        if surface in self._subscribers:
+            self._subscribers.remove(surface)
+        return len(self._subscribers)
+
+    def _on_tracks_changed(self):
+        self._tracks_changed = True
+
+    def sync(self, defer=False):
+        '''
+        Reconciles the elements with song.tracks if the track list changed
+        since the last time. Every subscriber calls this on a track list
+        change; only the first call does the work.
+        '''
+        if not self._tracks_changed:
+            return False
+        self.assign_tracks(defer)
+        return True
+
+    '''
+    Reconciles the TrackElements with song.tracks by track identity: new
+    tracks get an element and its listeners, removed tracks lose theirs and
+    tracks that only moved just get their index updated. With defer, or
+    while the deferred startup is still going, only armed and selected new
+    tracks get their listeners straight away.
+    '''
+
+    def assign_tracks(self, defer=False):
+        self._tracks_changed = False
+        tracks = self.song.tracks
+        previous = self.elements
+        deferring = defer or self.deferring
+
+        selected_key = None
+        if deferring:
+            selected_key = live_id(self.song.view.selected_track)
+
+        added = 0
+        removed = 0
+        self.tracks = []
+        self.elements = {}
+        for index in range(len(tracks)):
+            track = tracks[index]
+            key = live_id(track)
+            element = previous.pop(key, None)
+            if element is None:
+                element = TrackElement(index, track, self, attach=False)
+                if not deferring or element.armed or key == selected_key:
+                    element.attach()
+                    added += element.listener_count
+                else:
+                    self.unattached.append(element)
+                if element.armed:
+                    self._armed[key] = element
+                self.track_tags.update(key, track.name, element)
+            else:
+                element.index = index
+            self.tracks.append(element)
+            self.elements[key] = element
+
+        for key, element in previous.items():
+            self._armed.pop(key, None)
+            self.track_tags.remove(key)
+            self.instrument_cache.invalidate(element.track)
+            removed += element.release()
+
+        self.deferring = bool(self.unattached)
+        self.navigation.rebuild(self.tracks)
+        self.listener_ops = (added, removed)
+        self.listener_ops_total = (self.listener_ops_total[0] + added,
+                                   self.listener_ops_total[1] + removed)
+        debug_out("assign_tracks(): %d tracks, listeners added=%d removed=%d",
+                  len(self.tracks), added, removed)
+        for surface in self.subscribers:
+            surface.tracks_reassigned()
+
+    '''
+    Attaches listeners to up to limit (default all) tracks whose listeners
+    were deferred. Returns how many tracks were attached.
+    '''
+
+    def attach_pending_tracks(self, limit=None):
+        added = 0
+        count = 0
+        while self.unattached and (limit is None or count < limit):
+            element = self.unattached.popleft()
+            if element.track is None:
+                # Released by a track list change
+                continue
+            element.attach(catch_up=True)
+            added += element.listener_count
+            count += 1
+        self.deferring = bool(self.unattached)
+        self.listener_ops_total = (self.listener_ops_total[0] + added,
+                                   self.listener_ops_total[1])
+        return count
+
+    # TrackElement receiver
+
+    def track_midi_input_changed(self, element):
+        self.navigation.update(element)
+
+    def track_name_changed(self, element):
+        self.track_tags.update(live_id(element.track), element.track.name, element)
+        for surface in self.subscribers:
+            surface.track_renamed(element)
+
+    def track_arm_changed(self, element):
+        key = live_id(element.track)
+        if element.armed:
+            self._armed[key] = element
+        else:
+            self._armed.pop(key, None)
+
+    def forget_track_devices(self, track):
+        self.instrument_cache.invalidate(track)
+        self.instance_ids.prune(track)
+
+    def _instance_id_changed(self, device):
+        self.instrument_cache.invalidate(device)
+        for surface in self.subscribers:
+            surface.instance_id_changed(device)
+
+    def post_track_event(self, kind, element):
+        for surface in self.subscribers:
+            surface.post_track_event(kind, element)
+
+    # Queries
+
+    '''
+    Armable tracks that are armed or implicitly armed, in track order.
+    Maintained from the TrackElement arm listeners, so this costs time in
+    the number of armed tracks rather than the size of the set.
+    '''
+
+    def armed_elements(self):
+        return sorted(self._armed.values(), key=lambda e: e.index)
+
+    def track_index(self, track):
+        element = self.elements.get(live_id(track))
+        if element is not None:
+            return element.index
+        return None
+
+    def track_at(self, index):
+        if index is None:
+            return None
+        return self.tracks[index].track
+
+    def release(self):
+        self.song.remove_tracks_listener(self._on_tracks_changed)
+        debug_out("Song model: %d tracks, listeners added=%d removed=%d, "
+                  "instrument cache: %s, instance IDs: %s", len(self.tracks),
+                  self.listener_ops_total[0], self.listener_ops_total[1],
+                  self.instrument_cache.describe(), self.instance_ids.describe())
+        self.unattached.clear()
+        self.instrument_cache.clear()
+        self.instance_ids.clear()
+        for element in self.tracks:
+            element.release()
+        self.tracks = []
+        self.elements = {}
+        self._armed = {}
+        self.track_tags.clear()
+        self._subscribers = []
+
+
+# -------------------------------------------------------------------------------------------
+# Registry
+
+_models = {}
+
+
+def acquire(song, surface):
+    '''The shared model of song, with surface subscribed to it.'''
+    key = live_id(song)
+    model = _models.get(key)
+    if model is None:
+        model = _models[key] = SongModel(song)
+    model.subscribe(surface)
+    return model
+
+
+def release(model, surface):
+    '''Unsubscribes surface; the last subscriber tears the model down.'''
+    if model.unsubscribe(surface):
+        return
+    for key, known in list(_models.items()):
+        if known is model:
+            del _models[key]
+    model.release()
@@ -0,0 +1,144 @@
+import json
+import threading
+
+from KeyedTasks import TickTask
+
+'''
+Streams the tracks, their arm state and the controlled track's instrument
+to external tools (stage displays, lighting) as JSON lines over a
+BroadcastChannel.
+
+Every connection starts with a full snapshot; after that only deltas are
+sent, holding just the fields that changed:
+
+    {"type":"snapshot","seq":12,"focus":{...},"tracks":[{"id":..,"index":0,
+        "name":"Bass","arm":true,"implicit_arm":false,
+        "instrument":["Komplete Kontrol","01"]}, ...]}
+    {"type":"track","seq":13,"id":..,"arm":false,"instrument":null}
+    {"type":"remove","seq":14,"id":..}
+    {"type":"focus","seq":15,"id":..,"index":3,"instrument":[..]}
+
+ids are only stable while the script is loaded. The snapshot is built on
+the sender thread from the stream's own copy of the state, so deltas
+queued around a reconnect may repeat state the snapshot already holds:
+consumers skip messages whose seq is not above the snapshot's.
+
+Tracks are marked dirty from the Live listeners and read back at most
+once per tick.
+'''
+
+TRACK_FIELDS = ('index', 'name', 'arm', 'implicit_arm', 'instrument')
+
+
+def _encode(message):
+    return (json.dumps(message, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+class StateStream(object):
+
+    def __init__(self, tasks, channel, describe_track):
+        '''
+        describe_track(element) returns the element's fields (TRACK_FIELDS
+        except index) read from Live.
+        '''
+        self._channel = channel
+        self._describe_track = describe_track
+        self._lock = threading.Lock()
+        self._records = {}
+        self._focus = None
+        self._seq = 0
+        self._dirty = {}
+        self._flush_task = TickTask(tasks, self.flush)
+        self.deltas = 0
+        self.snapshots = 0
+
+    def mark(self, key, element):
+        '''Schedules element's fields to be read and diffed on the next tick.'''
+        self._dirty[key] = element
+        self._flush_task.schedule()
+
+    def track_list(self, elements):
+        '''
+        Follows a track list change, given the elements by key: new tracks
+        are marked, moved ones get an index delta without reading Live and
+        removed ones a remove.
+        '''
+        for key, element in elements.items():
+            record = self._records.get(key)
+            if record is None:
+                self.mark(key, element)
+            elif record['index'] != element.index:
+                self._publish(key, {'index': element.index})
+        for key in [key for key in self._records if key not in elements]:
+            self._remove(key)
+        for key in [key for key in self._dirty if key not in elements]:
+            del self._dirty[key]
+
+    def focus(self, key, index, instrument):
+        focus = {'id': key, 'index': index,
+                 'instrument': list(instrument) if instrument else None}
+        if focus == self._focus:
+            return
+        with self._lock:
+            self._focus = focus
+            self._seq += 1
+            message = dict(focus, type='focus', seq=self._seq)
+        self._send(message)
+
+    def flush(self):
+        self._flush_task.cancel()
+        dirty = self._dirty
+        self._dirty = {}
+        for key, element in dirty.items():
+            if element.track is None:
+                continue
+            fields = self._describe_track(element)
+            fields['index'] = element.index
+            if fields.get('instrument') is not None:
+                fields['instrument'] = list(fields['instrument'])
+            self._publish(key, fields)
+
+    def _publish(self, key, fields):
+        with self._lock:
+            record = self._records.get(key)
+            if record is None:
+                record = self._records[key] = dict((field, None) for field in TRACK_FIELDS)
+                changes = dict(fields)
+            else:
+                changes = dict((field, value) for field, value in fields.items()
+                               if record.get(field) != value)
+            if not changes:
+                return
+            record.update(changes)
+            self._seq += 1
+            message = dict(changes, type='track', seq=self._seq, id=key)
+        self._send(message)
+
+    def _remove(self, key):
+        with self._lock:
+            del self._records[key]
+            self._seq += 1
+            message = {'type': 'remove', 'seq': self._seq, 'id': key}
+        self._send(message)
+
+    def _send(self, message):
+        self.deltas += 1
+        self._channel.send(_encode(message))
+
+    def snapshot(self):
+        '''The full state as one message; safe to call from any thread.'''
+        with self._lock:
+            tracks = [dict(record, id=key) for key, record in self._records.items()]
+            message = {'type': 'snapshot', 'seq': self._seq,
+                       'focus': self._focus, 'tracks': tracks}
+        tracks.sort(key=lambda record: record['index'])
+        self.snapshots += 1
+        return _encode(message)
+
+    def clear(self):
+        self._dirty = {}
+        self._flush_task.cancel()
+
+    def describe(self):
+        return 'tracks=%d deltas=%d snapshots=%d' % (
+            len(self._records), self.deltas, self.snapshots)
@@ -0,0 +1,92 @@
+'''
+SysEx messages for the Komplete Kontrol S-series DAW port.
+
+Messages are assembled from fixed header templates plus bulk-encoded text,
+and SysExCache remembers the last message of each kind so byte-identical
+updates need not be sent to the keyboard again.
+'''
+
+SYSEX_START = 240
+SYSEX_END = 247
+FIELD_SEPARATOR = 25
+REPLACEMENT_CHAR = ord('?')
+
+STATUS_HEADER = (SYSEX_START, 0, 0, 102, 20, 18, 0)
+DISPLAY_HEADER = (SYSEX_START, 0, 0, 102, 23, 18)
+
+DISPLAY_WIDTH = 28
+DISPLAY_GRIDS = 4
+
+KIND_STATUS = 'status'
+
+_SEPARATOR = (FIELD_SEPARATOR,)
+_END = (SYSEX_END,)
+
+
+def encode_text(text):
+    '''
+    Returns text as a tuple of 7-bit data bytes. Characters outside ASCII
+    cannot be carried by SysEx and are replaced with '?'.
+    '''
+    if not isinstance(text, bytes):
+        text = text.encode('ascii', 'replace')
+    data = bytearray(text)
+    if data and max(data) > 127:
+        data = bytearray(b if b < 128 else REPLACEMENT_CHAR for b in data)
+    return tuple(data)
+
+
+def status_message(index, track_name, instrument):
+    '''
+    Track status: track name, track index and, when known, the instrument
+    name and Komplete Kontrol instance ID.
+    '''
+    message = STATUS_HEADER + encode_text(track_name) + _SEPARATOR + \
+        encode_text(str(index))
+    if instrument is not None:
+        message += _SEPARATOR + encode_text(instrument[0])
+        if instrument[1] is not None:
+            message += _SEPARATOR + encode_text(instrument[1])
+    return message + _END
+
+
+def display_message(text, grid=0):
+    '''Fills one of the four 28 character display grids with text.'''
+    if len(text) > DISPLAY_WIDTH:
+        text = text[:DISPLAY_WIDTH - 1]
+    grid = min(grid, DISPLAY_GRIDS - 1)
+    return DISPLAY_HEADER + (grid * DISPLAY_WIDTH,) + \
+        encode_text(text.ljust(DISPLAY_WIDTH)) + _END
+
+
+def display_kind(grid):
+    return ('display', min(grid, DISPLAY_GRIDS - 1))
+
+
+class SysExCache(object):
+    '''
+    Last SysEx sent per message kind. changed() tells whether a message
+    differs from the previous one of its kind and remembers it if so.
+    '''
+
+    def __init__(self):
+        self._last = {}
+        self.sent = 0
+        self.suppressed = 0
+
+    def changed(self, kind, message):
+        if self._last.get(kind) == message:
+            self.suppressed += 1
+            return False
+        self._last[kind] = message
+        self.sent += 1
+        return True
+
+    def last(self, kind):
+        return self._last.get(kind)
+
+    def reset(self, kind=None):
+        if kind is None:
+            self._last = {}
+        else:
+            self._last.pop(kind, None)
@@ -0,0 +1,72 @@
+'''
+Index of tracks by the tag markers in their names.
+
+A marker is a substring such as '[MIDISRC]'; a track whose name contains it
+carries the marker's tag. The index is fed from track name listeners, so
+finding the tracks with a tag never has to read every track's name.
+'''
+
+TAG_NEEDS_MIDI_SOURCE = 'needs_midi_source'
+TAG_MIDI_SOURCE = 'midi_source'
+
+# Tag -> name marker. Add entries here to make further tags available to
+# the index, e.g. for bank jumps.
+TRACK_TAG_MARKERS = {
+    TAG_NEEDS_MIDI_SOURCE: '[M]',
+    TAG_MIDI_SOURCE: '[MIDISRC]',
+}
+
+
+def tags_for_name(name, markers=TRACK_TAG_MARKERS):
+    return frozenset(tag for tag, marker in markers.items() if marker in name)
+
+
+class TrackTagIndex(object):
+
+    def __init__(self, markers=None):
+        self._markers = dict(TRACK_TAG_MARKERS if markers is None else markers)
+        self._names = {}
+        self._items = {}
+        self._tags = {}
+        self._tagged = dict((tag, {}) for tag in self._markers)
+
+    def register_tag(self, tag, marker):
+        '''Adds (or changes) a tag and re-tags the known tracks.'''
+        self._markers[tag] = marker
+        self._tagged[tag] = {}
+        for key, name in list(self._names.items()):
+            self.update(key, name, self._items[key])
+
+    def update(self, key, name, item):
+        '''Records the current name of the track identified by key.'''
+        tags = tags_for_name(name, self._markers)
+        old_tags = self._tags.get(key, frozenset())
+        for tag in old_tags - tags:
+            self._tagged[tag].pop(key, None)
+        for tag in tags:
+            self._tagged[tag][key] = item
+        self._names[key] = name
+        self._items[key] = item
+        self._tags[key] = tags
+
+    def remove(self, key):
+        for tag in self._tags.pop(key, ()):
+            self._tagged[tag].pop(key, None)
+        self._names.pop(key, None)
+        self._items.pop(key, None)
+
+    def clear(self):
+        self._names = {}
+        self._items = {}
+        self._tags = {}
+        self._tagged = dict((tag, {}) for tag in self._markers)
+
+    def has_tag(self, key, tag):
+        return tag in self._tags.get(key, ())
+
+    def tags(self, key):
+        return self._tags.get(key, frozenset())
+
+    def tagged(self, tag):
+        '''Items carrying tag, in no particular order.'''
+        return list(self._tagged.get(tag, {}).values())
@@ -0,0 +1,166 @@
+'''
+Exercises BroadcastChannel against a listener socket on this machine:
+delivery, not blocking while nothing listens, drop-oldest on overflow and
+reconnecting after the listener restarts. Then checks that a FocusControl
+streaming its state there sends a snapshot followed by deltas.
+
+    python bench/check_broadcast.py
+'''
+
+from __future__ import print_function
+
+import json
+import socket
+import sys
+import threading
+import time
+
+import harness
+import synthetic
+
+import FocusControl
+
+from BroadcastChannel import BroadcastChannel
+from GUtil import timer
+
+
+class Listener(object):
+    '''Accepts connections on port and collects every line received.'''
+
+    def __init__(self, port=0):
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(('127.0.0.1', port))
+        self._server.listen(1)
+        self.port = self._server.getsockname()[1]
+        self.lines = []
+        self._buffer = b''
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except (socket.error, OSError):
+                return
+            while True:
+                try:
+                    data = conn.recv(4096)
+                except (socket.error, OSError):
+                    data = b''
+                if not data:
+                    conn.close()
+                    break
+                self._buffer += data
+                while b'\n' in self._buffer:
+                    line, self._buffer = self._buffer.split(b'\n', 1)
+                    self.lines.append(line.decode('utf-8'))
+
+    def close(self):
+        self._server.close()
+
+    def wait_for(self, count, timeout=5.0):
+        deadline = time.time() + timeout
+        while len(self.lines) < count and time.time() < deadline:
+            time.sleep(0.01)
+        return len(self.lines) >= count
+
+
+def check(name, ok):
+    print('%-50s %s' % (name, 'ok' if ok else 'FAILED'))
+    return ok
+
+
+def main():
+    results = []
+
+    listener = Listener()
+    channel = BroadcastChannel('127.0.0.1', listener.port, min_backoff=0.05,
+                               max_backoff=0.2)
+    channel.start()
+    for i in range(100):
+        channel.send('message %d\n' % i)
+    results.append(check('delivers queued messages in order',
+                         listener.wait_for(100) and
+                         listener.lines == ['message %d' % i for i in range(100)]))
+    port = listener.port
+    listener.close()
+    channel.close()
+
+    # Nothing listening: send() must return at once and keep the newest
+    idle = BroadcastChannel('127.0.0.1', port, queue_size=10,
+                            min_backoff=0.05, max_backoff=0.2)
+    idle.start()
+    start = timer()
+    for i in range(1000):
+        idle.send('late %d\n' % i)
+    elapsed = timer() - start
+    results.append(check('send() does not block without a listener (%.2f ms)' % (elapsed * 1000),
+                         elapsed < 0.5))
+    results.append(check('overflow drops the oldest messages',
+                         idle.dropped >= 990 and idle.pending() <= 10))
+    time.sleep(0.3)
+    results.append(check('connection failures are counted',
+                         idle.failures > 0 and not idle.connected))
+
+    listener = Listener(port)
+    results.append(check('reconnects and sends the newest messages',
+                         listener.wait_for(10) and
+                         listener.lines[-1] == 'late 999'))
+    print('channel: %s' % idle.describe())
+    start = timer()
+    idle.close()
+    elapsed = timer() - start
+    results.append(check('close() does not wait for the sender thread (%.2f ms)' % (elapsed * 1000),
+                         elapsed < 0.05))
+    listener.close()
+
+    results.extend(check_state_stream())
+    return 0 if all(results) else 1
+
+
+def check_state_stream():
+    results = []
+    listener = Listener()
+    saved = FocusControl.STATE_STREAM_ADDRESS
+    FocusControl.STATE_STREAM_ADDRESS = ('127.0.0.1', listener.port)
+    try:
+        song = synthetic.build_set(20)
+        surface, c_instance = harness.create_surface(song)
+    finally:
+        FocusControl.STATE_STREAM_ADDRESS = saved
+    while surface._deferring_startup:
+        harness.tick(surface)
+    harness.tick(surface, 3)
+
+    listener.wait_for(1)
+    messages = [json.loads(line) for line in listener.lines]
+    snapshot = [m for m in messages if m['type'] == 'snapshot']
+    results.append(check('state stream starts with a snapshot',
+                         bool(snapshot) and messages[0]['type'] == 'snapshot'))
+
+    track = song.tracks[3]
+    track.arm = True
+    harness.tick(surface, 3)
+    count = len(listener.lines)
+    listener.wait_for(count + 1, timeout=1.0)
+    messages = [json.loads(line) for line in listener.lines]
+    armed = [m for m in messages if m['type'] == 'track' and m.get('arm') is True]
+    results.append(check('arming a track streams a delta',
+                         any(m.get('instrument') for m in armed) and
+                         all(set(m) <= set(('type', 'seq', 'id', 'index', 'name', 'arm',
+                                            'implicit_arm', 'instrument')) for m in armed)))
+    focus = [m for m in messages if m['type'] == 'focus']
+    results.append(check('the controlled track streams a focus message',
+                         bool(focus) and focus[-1]['index'] == 3))
+    seqs = [m['seq'] for m in messages]
+    results.append(check('sequence numbers increase', seqs == sorted(seqs)))
+    surface.disconnect()
+    listener.close()
+    return results
+
+
+if __name__ == '__main__':
+    sys.exit(main())
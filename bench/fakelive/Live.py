@@ -0,0 +1,371 @@
+'''
+Headless stand-in for the parts of Ableton's Live module used by the
+Komplete Kontrol scripts.
+
+Objects mimic the Live Object Model closely enough to drive FocusControl:
+properties that Live lets scripts observe get add_/remove_/_has_ listener
+methods, adding the same listener twice or removing an unknown one raises
+like Live does, and every object carries a unique _live_ptr. Module level
+counters record listener traffic and property reads so benchmarks can show
+how much work crosses the (here imaginary) Python/C++ boundary.
+'''
+
+import itertools
+
+STATS = {
+    'listeners_added': 0,
+    'listeners_removed': 0,
+    'property_reads': 0,
+}
+
+_ptr_counter = itertools.count(1)
+
+
+def reset_stats():
+    for key in STATS:
+        STATS[key] = 0
+
+
+class LiveObject(object):
+    '''
+    Base class providing Live style listener management for the property
+    names listed in _observable.
+    '''
+
+    _observable = ()
+
+    def __init__(self):
+        self._live_ptr = next(_ptr_counter)
+        self._listeners = {}
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name.startswith('add_') and name.endswith('_listener'):
+            prop = name[4:-9]
+            if prop in self._observable:
+                return lambda listener: self._add_listener(prop, listener)
+        elif name.startswith('remove_') and name.endswith('_listener'):
+            prop = name[7:-9]
+            if prop in self._observable:
+                return lambda listener: self._remove_listener(prop, listener)
+        elif name.endswith('_has_listener'):
+            prop = name[:-13]
+            if prop in self._observable:
+                return lambda listener: listener in self._listeners.get(prop, [])
+        raise AttributeError(name)
+
+    def _add_listener(self, prop, listener):
+        listeners = self._listeners.setdefault(prop, [])
+        if listener in listeners:
+            raise RuntimeError('Listener already connected: %s' % prop)
+        listeners.append(listener)
+        STATS['listeners_added'] += 1
+
+    def _remove_listener(self, prop, listener):
+        listeners = self._listeners.get(prop, [])
+        if listener not in listeners:
+            raise RuntimeError('Listener not connected: %s' % prop)
+        listeners.remove(listener)
+        STATS['listeners_removed'] += 1
+
+    def listener_count(self, prop=None):
+        if prop is not None:
+            return len(self._listeners.get(prop, []))
+        return sum(len(l) for l in self._listeners.values())
+
+    def notify(self, prop):
+        for listener in list(self._listeners.get(prop, [])):
+            listener()
+
+    def _read(self, value):
+        STATS['property_reads'] += 1
+        return value
+
+
+def _observed_property(prop, read_only=False):
+    attr = '_' + prop
+
+    def getter(self):
+        return self._read(getattr(self, attr))
+
+    def setter(self, value):
+        if getattr(self, attr) != value:
+            setattr(self, attr, value)
+            self.notify(prop)
+
+    if read_only:
+        return property(getter)
+    return property(getter, setter)
+
+
+# -------------------------------------------------------------------------------------------
+# Devices
+
+
+class DeviceParameter(LiveObject):
+
+    _observable = ('name', 'value')
+
+    def __init__(self, name, value=0.0, min=0.0, max=1.0, is_quantized=False):
+        super(DeviceParameter, self).__init__()
+        self._name = name
+        self._value = value
+        self.min = min
+        self.max = max
+        self.is_quantized = is_quantized
+        self.is_enabled = True
+        self.original_name = name
+        self.writes = 0
+
+    name = _observed_property('name')
+
+    def _get_value(self):
+        return self._read(self._value)
+
+    def _set_value(self, value):
+        if value < self.min or value > self.max:
+            raise RuntimeError('Invalid value')
+        self.writes += 1
+        if value != self._value:
+            self._value = value
+            self.notify('value')
+
+    value = property(_get_value, _set_value)
+
+
+class Chain(LiveObject):
+
+    _observable = ('devices', 'name')
+
+    def __init__(self, name='Chain', devices=()):
+        super(Chain, self).__init__()
+        self._name = name
+        self._devices = list(devices)
+
+    name = _observed_property('name')
+
+    def _get_devices(self):
+        return self._read(tuple(self._devices))
+
+    def _set_devices(self, devices):
+        self._devices = list(devices)
+        self.notify('devices')
+
+    devices = property(_get_devices, _set_devices)
+
+
+class DeviceType(object):
+    undefined = 0
+    instrument = 1
+    audio_effect = 2
+    midi_effect = 4
+
+
+class Device(LiveObject):
+
+    _observable = ('chains', 'name', 'parameters')
+
+    def __init__(self, name, class_name, class_display_name=None,
+                 type=DeviceType.instrument, parameters=None, chains=None):
+        super(Device, self).__init__()
+        self._name = name
+        self.class_name = class_name
+        self.class_display_name = class_display_name or name
+        self.type = type
+        self._parameters = list(parameters if parameters is not None else
+                                [DeviceParameter('Device On', 1.0)])
+        self._chains = list(chains) if chains is not None else None
+
+    name = _observed_property('name')
+
+    @property
+    def can_have_chains(self):
+        return self._chains is not None
+
+    def _get_chains(self):
+        return self._read(tuple(self._chains or ()))
+
+    def _set_chains(self, chains):
+        self._chains = list(chains)
+        self.notify('chains')
+
+    chains = property(_get_chains, _set_chains)
+
+    def _get_parameters(self):
+        return self._read(tuple(self._parameters))
+
+    parameters = property(_get_parameters)
+
+
+# -------------------------------------------------------------------------------------------
+# Tracks and Song
+
+
+class MixerDevice(LiveObject):
+
+    def __init__(self):
+        super(MixerDevice, self).__init__()
+        self.volume = DeviceParameter('Track Volume', 0.85)
+        self.panning = DeviceParameter('Track Panning', 0.5, -1.0, 1.0)
+
+
+class Track(LiveObject):
+
+    _observable = ('arm', 'implicit_arm', 'devices', 'name', 'has_midi_input',
+                   'color', 'mute', 'solo')
+
+    def __init__(self, name, can_be_armed=True, has_midi_input=True,
+                 devices=(), is_foldable=False, group_track=None):
+        super(Track, self).__init__()
+        self._name = name
+        self._arm = False
+        self._implicit_arm = False
+        self._can_be_armed = can_be_armed
+        self._has_midi_input = has_midi_input
+        self._devices = list(devices)
+        self.is_foldable = is_foldable
+        self.group_track = group_track
+        self.is_grouped = group_track is not None
+        self.fold_state = 0
+        self.mixer_device = MixerDevice()
+        self.color = 0
+        self.mute = False
+        self.solo = False
+
+    name = _observed_property('name')
+    implicit_arm = _observed_property('implicit_arm')
+    has_midi_input = _observed_property('has_midi_input')
+
+    @property
+    def can_be_armed(self):
+        return self._read(self._can_be_armed)
+
+    def _get_arm(self):
+        return self._read(self._arm)
+
+    def _set_arm(self, value):
+        if not self._can_be_armed:
+            raise RuntimeError('Track cannot be armed')
+        if self._arm != value:
+            self._arm = value
+            self.notify('arm')
+
+    arm = property(_get_arm, _set_arm)
+
+    def _get_devices(self):
+        return self._read(tuple(self._devices))
+
+    def _set_devices(self, devices):
+        self._devices = list(devices)
+        self.notify('devices')
+
+    devices = property(_get_devices, _set_devices)
+
+
+class SongView(LiveObject):
+
+    _observable = ('selected_track',)
+
+    def __init__(self, song):
+        super(SongView, self).__init__()
+        self._song = song
+        self._selected_track = None
+
+    selected_track = _observed_property('selected_track')
+
+
+class Song(LiveObject):
+
+    _observable = ('tracks', 'visible_tracks', 'return_tracks', 'is_playing',
+                   'record_mode', 'session_record', 'loop', 'tempo')
+
+    RecordingQuantization = None
+
+    def __init__(self, tracks=()):
+        super(Song, self).__init__()
+        self._tracks = list(tracks)
+        self._is_playing = False
+        self.view = SongView(self)
+        self.master_track = Track('Master', can_be_armed=False,
+                                  has_midi_input=False)
+        self.return_tracks = ()
+        self.record_mode = False
+        self.session_record = False
+        self.loop = False
+        if self._tracks:
+            self.view._selected_track = self._tracks[0]
+
+    is_playing = _observed_property('is_playing')
+
+    def _get_tracks(self):
+        return self._read(tuple(self._tracks))
+
+    def _set_tracks(self, tracks):
+        self._tracks = list(tracks)
+        self.notify('tracks')
+        self.notify('visible_tracks')
+
+    tracks = property(_get_tracks, _set_tracks)
+
+    @property
+    def visible_tracks(self):
+        return self._read(tuple(t for t in self._tracks
+                                if t.group_track is None or t.group_track.fold_state == 0))
+
+    def stop_playing(self):
+        self.is_playing = False
+
+    def start_playing(self):
+        self.is_playing = True
+
+
+class _RecordingQuantization(object):
+    rec_q_no_q = 0
+
+
+Song.RecordingQuantization = _RecordingQuantization
+
+
+# -------------------------------------------------------------------------------------------
+# MidiMap
+
+
+class MidiMap(object):
+
+    class MapMode(object):
+        absolute = 0
+        absolute_14_bit = 1
+        relative_signed_bit = 2
+        relative_binary_offset = 3
+        relative_signed_bit2 = 4
+        relative_two_compliment = 5
+        relative_smooth_signed_bit = 6
+        relative_smooth_binary_offset = 7
+        relative_smooth_signed_bit2 = 8
+        relative_smooth_two_compliment = 9
+
+    @staticmethod
+    def map_midi_cc(handle, parameter, channel, cc, map_mode, avoid_takeover):
+        handle.append(('cc', channel, cc, parameter))
+        return True
+
+    @staticmethod
+    def map_midi_cc_with_feedback_map(handle, parameter, channel, cc, map_mode,
+                                      feedback_rule, avoid_takeover, sensitivity=1.0):
+        handle.append(('cc', channel, cc, parameter))
+        return True
+
+    @staticmethod
+    def forward_midi_cc(script_handle, handle, channel, cc):
+        handle.append(('fwd_cc', channel, cc))
+        return True
+
+    @staticmethod
+    def forward_midi_note(script_handle, handle, channel, note):
+        handle.append(('fwd_note', channel, note))
+        return True
+
+    @staticmethod
+    def send_feedback_for_parameter(handle, parameter):
+        pass
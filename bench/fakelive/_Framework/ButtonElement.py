@@ -0,0 +1,23 @@
+from _Framework.InputControlElement import InputControlElement, MIDI_NOTE_TYPE
+
+ON_VALUE = 127
+OFF_VALUE = 0
+
+
+class ButtonElement(InputControlElement):
+
+    def __init__(self, is_momentary, msg_type, channel, identifier, *a, **k):
+        super(ButtonElement, self).__init__(msg_type, channel, identifier, *a, **k)
+        self._is_momentary = bool(is_momentary)
+
+    def is_momentary(self):
+        return self._is_momentary
+
+    def is_pressed(self):
+        return False
+
+    def turn_on(self):
+        self.send_value(ON_VALUE)
+
+    def turn_off(self):
+        self.send_value(OFF_VALUE)
@@ -0,0 +1,20 @@
+CONTROLLER_ID_KEY = 'controller_id'
+PORTS_KEY = 'ports'
+HIDDEN = 'hidden'
+NOTES_CC = 'notes_cc'
+SCRIPT = 'script'
+SYNC = 'sync'
+REMOTE = 'remote'
+
+
+def controller_id(vendor_id, product_ids, model_name):
+    return {'vendor_id': vendor_id, 'product_ids': product_ids,
+            'model_name': model_name}
+
+
+def inport(props=[]):
+    return {'direction': 'in', 'props': props}
+
+
+def outport(props=[]):
+    return {'direction': 'out', 'props': props}
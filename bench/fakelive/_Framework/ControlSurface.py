@@ -0,0 +1,144 @@
+'''
+Headless ControlSurface: owns the task group, routes incoming MIDI to the
+registered control elements, and talks to Live through c_instance.
+'''
+
+from __future__ import with_statement
+
+from contextlib import contextmanager
+
+from _Framework import Task
+from _Framework import InputControlElement as ice
+
+# Components reach Live through the control surface that created them.
+_active_song = []
+
+
+def current_song():
+    return _active_song[-1] if _active_song else None
+
+
+class ControlSurface(object):
+
+    def __init__(self, c_instance, *a, **k):
+        self._c_instance = c_instance
+        self._suppress_send_midi = False
+        self._suppress_rebuild_requests = False
+        self._rebuild_requests_while_suppressed = 0
+        self._controls = []
+        self._forwarding_registry = {}
+        self._device_component = None
+        self._task_group = Task.TaskGroup(auto_kill=False)
+        self._midi_map_handle = None
+        _active_song.append(self.song())
+        self.song().add_tracks_listener(self._on_track_list_changed)
+        self.song().view.add_selected_track_listener(self._on_selected_track_changed)
+
+    def song(self):
+        return self._c_instance.song()
+
+    def application(self):
+        return None
+
+    @property
+    def _tasks(self):
+        return self._task_group
+
+    def log_message(self, *message):
+        self._c_instance.log_message(' '.join(map(str, message)))
+
+    def show_message(self, message):
+        self._c_instance.show_message(message)
+
+    @contextmanager
+    def component_guard(self):
+        ice._element_sink.append(self)
+        try:
+            yield
+        finally:
+            ice._element_sink.pop()
+
+    def _register_control(self, control):
+        control._send_midi_callback = self._send_midi
+        control._request_rebuild_callback = self.request_rebuild_midi_map
+        self._controls.append(control)
+
+    def set_device_component(self, device_component):
+        self._device_component = device_component
+        device_component.set_device(self.song().view.selected_track.devices[0]
+                                    if self.song().view.selected_track and
+                                    self.song().view.selected_track.devices else None)
+
+    def _set_suppress_rebuild_requests(self, suppress):
+        self._suppress_rebuild_requests = suppress
+        if not suppress and self._rebuild_requests_while_suppressed:
+            self._rebuild_requests_while_suppressed = 0
+            self.request_rebuild_midi_map()
+
+    def request_rebuild_midi_map(self):
+        if self._suppress_rebuild_requests:
+            self._rebuild_requests_while_suppressed += 1
+        else:
+            self._c_instance.request_rebuild_midi_map()
+
+    def build_midi_map(self, midi_map_handle):
+        self._forwarding_registry = {}
+        self._midi_map_handle = midi_map_handle
+
+        def install_mapping(control, parameter):
+            midi_map_handle.append(('cc', control.message_channel(),
+                                    control.message_identifier(), parameter))
+            return True
+
+        def install_forwarding(control):
+            key = (control.status_byte(), control.message_identifier())
+            self._forwarding_registry[key] = control
+            return True
+
+        for control in self._controls:
+            control.install_connections(None, install_mapping, install_forwarding)
+
+    def receive_midi(self, midi_bytes):
+        if len(midi_bytes) != 3:
+            return
+        status = midi_bytes[0]
+        if status & 240 == ice.MIDI_NOTE_OFF_STATUS:
+            status = ice.MIDI_NOTE_ON_STATUS + (status & 15)
+        for control in self._controls:
+            if control.status_byte() == status and \
+                    control.message_identifier() == midi_bytes[1]:
+                control.receive_value(midi_bytes[2])
+
+    def _send_midi(self, midi_event_bytes, optimized=None):
+        if self._suppress_send_midi:
+            return False
+        self._c_instance.send_midi(midi_event_bytes)
+        return True
+
+    def refresh_state(self):
+        pass
+
+    def update_display(self):
+        self._task_group.update(0.1)
+
+    def _on_track_list_changed(self):
+        pass
+
+    def _on_selected_track_changed(self):
+        pass
+
+    def set_controlled_track(self, track):
+        self._controlled_track = track
+
+    def disconnect(self):
+        self._task_group.clear()
+        if self.song() in _active_song:
+            _active_song.remove(self.song())
+        self.song().remove_tracks_listener(self._on_track_list_changed)
+        self.song().view.remove_selected_track_listener(self._on_selected_track_changed)
+        for control in self._controls:
+            control.disconnect()
+        self._controls = []
+        if self._device_component is not None:
+            self._device_component.disconnect()
+            self._device_component = None
@@ -0,0 +1,45 @@
+class DeviceComponent(object):
+    '''
+    Maps its parameter controls onto the current bank of the device it is
+    given: banks of 8 parameters after Device On, the first one standing in
+    for the framework's best-of-bank.
+    '''
+
+    def __init__(self, device_selection_follows_track_selection=False, *a, **k):
+        self.name = ''
+        self._device = None
+        self._parameter_controls = ()
+        self._bank_index = 0
+        self._device_selection_follows_track_selection = device_selection_follows_track_selection
+
+    def set_parameter_controls(self, controls):
+        self._parameter_controls = tuple(controls)
+        self.update()
+
+    def set_device(self, device):
+        self._device = device
+        self.update()
+
+    def device(self):
+        return self._device
+
+    def _current_bank_details(self):
+        if self._device is None:
+            return ('', [])
+        start = 1 + 8 * self._bank_index
+        return ('Bank %d' % (self._bank_index + 1),
+                list(self._device.parameters[start:start + 8]))
+
+    def update(self):
+        bank = self._current_bank_details()[1]
+        for index, control in enumerate(self._parameter_controls):
+            if index < len(bank) and bank[index] is not None:
+                control.connect_to(bank[index])
+            else:
+                control.release_parameter()
+
+    def disconnect(self):
+        for control in self._parameter_controls:
+            control.release_parameter()
+        self._parameter_controls = ()
+        self._device = None
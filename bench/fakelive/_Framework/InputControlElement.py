@@ -0,0 +1,110 @@
+'''
+Control element base and MIDI constants as exported by
+_Framework.InputControlElement.
+'''
+
+MIDI_NOTE_TYPE = 0
+MIDI_CC_TYPE = 1
+MIDI_PB_TYPE = 2
+MIDI_SYSEX_TYPE = 3
+MIDI_INVALID_TYPE = 4
+
+MIDI_NOTE_ON_STATUS = 144
+MIDI_NOTE_OFF_STATUS = 128
+MIDI_CC_STATUS = 176
+MIDI_PB_STATUS = 224
+
+_STATUS_BY_TYPE = {
+    MIDI_NOTE_TYPE: MIDI_NOTE_ON_STATUS,
+    MIDI_CC_TYPE: MIDI_CC_STATUS,
+    MIDI_PB_TYPE: MIDI_PB_STATUS,
+}
+
+# Elements created while a control surface is inside component_guard()
+# register themselves with it so incoming MIDI can be routed to them.
+_element_sink = []
+
+
+class InputControlElement(object):
+
+    def __init__(self, msg_type, channel, identifier, name=None, *a, **k):
+        self._msg_type = msg_type
+        self._original_channel = channel
+        self._original_identifier = identifier
+        self._value_listeners = []
+        self._parameter_to_map_to = None
+        self._send_midi_callback = None
+        self._request_rebuild_callback = None
+        self._last_sent_value = -1
+        self.name = name or ''
+        if _element_sink:
+            _element_sink[-1]._register_control(self)
+
+    def message_type(self):
+        return self._msg_type
+
+    def message_channel(self):
+        return self._original_channel
+
+    def message_identifier(self):
+        return self._original_identifier
+
+    def message_map_mode(self):
+        return None
+
+    def status_byte(self):
+        return _STATUS_BY_TYPE.get(self._msg_type, 0) + self._original_channel
+
+    def add_value_listener(self, listener, identify_sender=False):
+        if listener in self._value_listeners:
+            raise RuntimeError('Listener already connected')
+        self._value_listeners.append(listener)
+
+    def remove_value_listener(self, listener):
+        self._value_listeners.remove(listener)
+
+    def value_has_listener(self, listener):
+        return listener in self._value_listeners
+
+    def value_listener_count(self):
+        return len(self._value_listeners)
+
+    def receive_value(self, value):
+        for listener in list(self._value_listeners):
+            listener(value)
+
+    def connect_to(self, parameter):
+        if self._parameter_to_map_to != parameter:
+            self._parameter_to_map_to = parameter
+            self._request_rebuild()
+
+    def release_parameter(self):
+        if self._parameter_to_map_to is not None:
+            self._parameter_to_map_to = None
+            self._request_rebuild()
+
+    def mapped_parameter(self):
+        return self._parameter_to_map_to
+
+    def script_wants_forwarding(self):
+        return len(self._value_listeners) > 0
+
+    def install_connections(self, install_translation, install_mapping, install_forwarding):
+        if self._parameter_to_map_to is not None:
+            install_mapping(self, self._parameter_to_map_to)
+        if self.script_wants_forwarding():
+            install_forwarding(self)
+
+    def _request_rebuild(self):
+        if self._request_rebuild_callback is not None:
+            self._request_rebuild_callback()
+
+    def send_value(self, value, force=False):
+        if force or value != self._last_sent_value:
+            self._last_sent_value = value
+            if self._send_midi_callback is not None:
+                self._send_midi_callback((self.status_byte(), self._original_identifier, value))
+
+    def disconnect(self):
+        self._value_listeners = []
+        self._parameter_to_map_to = None
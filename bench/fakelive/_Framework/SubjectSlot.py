@@ -0,0 +1,55 @@
+'''
+Minimal subject_slot decorator: assigning slot.subject connects the
+decorated method as a listener for the named event on that subject.
+'''
+
+
+class SubjectSlot(object):
+
+    def __init__(self, owner, event, function):
+        self._owner = owner
+        self._event = event
+        self._function = function
+        self._subject = None
+
+    def _listener(self, *a):
+        return self._function(self._owner, *a)
+
+    def __call__(self, *a):
+        return self._function(self._owner, *a)
+
+    def _get_subject(self):
+        return self._subject
+
+    def _set_subject(self, subject):
+        if self._subject is not None:
+            getattr(self._subject, 'remove_%s_listener' % self._event)(self._listener)
+        self._subject = subject
+        if subject is not None:
+            getattr(subject, 'add_%s_listener' % self._event)(self._listener)
+
+    subject = property(_get_subject, _set_subject)
+
+    def disconnect(self):
+        self.subject = None
+
+
+class subject_slot(object):
+
+    def __init__(self, event):
+        self._event = event
+
+    def __call__(self, function):
+        event = self._event
+        attr = '_subject_slot_' + function.__name__
+
+        def get_slot(owner, owner_type=None):
+            if owner is None:
+                return function
+            slot = owner.__dict__.get(attr)
+            if slot is None:
+                slot = SubjectSlot(owner, event, function)
+                owner.__dict__[attr] = slot
+            return slot
+
+        return property(get_slot)
@@ -0,0 +1,125 @@
+'''
+Tick driven tasks modelled on _Framework.Task: run, delay, sequence and a
+TaskGroup that the control surface updates once per tick.
+'''
+
+
+class Task(object):
+
+    def __init__(self):
+        self._killed = False
+        self._done = False
+
+    def kill(self):
+        self._killed = True
+        return self
+
+    @property
+    def is_killed(self):
+        return self._killed
+
+    @property
+    def is_running(self):
+        return not (self._killed or self._done)
+
+    def update(self, delta):
+        '''Advances the task by one tick. Returns True while not finished.'''
+        if not self.is_running:
+            return False
+        self._done = not self._step(delta)
+        return not self._done
+
+    def _step(self, delta):
+        return False
+
+
+class FuncTask(Task):
+
+    def __init__(self, func):
+        super(FuncTask, self).__init__()
+        self._func = func
+
+    def _step(self, delta):
+        self._func()
+        return False
+
+
+class DelayTask(Task):
+
+    def __init__(self, ticks):
+        super(DelayTask, self).__init__()
+        self._remaining = ticks
+
+    def _step(self, delta):
+        self._remaining -= 1
+        return self._remaining > 0
+
+
+class SequenceTask(Task):
+
+    def __init__(self, tasks):
+        super(SequenceTask, self).__init__()
+        self._tasks = list(tasks)
+
+    def _step(self, delta):
+        while self._tasks:
+            if self._tasks[0].update(delta):
+                return True
+            self._tasks.pop(0)
+        return False
+
+
+class LoopTask(Task):
+
+    def __init__(self, func):
+        super(LoopTask, self).__init__()
+        self._func = func
+
+    def _step(self, delta):
+        self._func()
+        return True
+
+
+def run(func, *a, **k):
+    return FuncTask(lambda: func(*a, **k))
+
+
+def delay(ticks):
+    return DelayTask(ticks)
+
+
+def sequence(*tasks):
+    return SequenceTask(tasks)
+
+
+def loop(func):
+    return LoopTask(func)
+
+
+class TaskGroup(Task):
+
+    def __init__(self, auto_kill=False):
+        super(TaskGroup, self).__init__()
+        self._children = []
+
+    def add(self, task):
+        if callable(task) and not isinstance(task, Task):
+            task = FuncTask(task)
+        self._children.append(task)
+        return task
+
+    def clear(self):
+        for task in self._children:
+            task.kill()
+        self._children = []
+
+    @property
+    def count(self):
+        return len(self._children)
+
+    def _step(self, delta):
+        children = self._children
+        self._children = []
+        remaining = [task for task in children if task.update(delta)]
+        self._children = remaining + self._children
+        return True
@@ -0,0 +1,30 @@
+class TransportComponent(object):
+    '''Records the buttons it was given; the transport itself is Live's.'''
+
+    def __init__(self, *a, **k):
+        self.buttons = {}
+
+    def _set(self, name, button):
+        self.buttons[name] = button
+
+    def set_play_button(self, button):
+        self._set('play', button)
+
+    def set_stop_button(self, button):
+        self._set('stop', button)
+
+    def set_record_button(self, button):
+        self._set('record', button)
+
+    def set_loop_button(self, button):
+        self._set('loop', button)
+
+    def set_overdub_button(self, button):
+        self._set('overdub', button)
+
+    def set_seek_buttons(self, ffwd_button, rwd_button):
+        self._set('ffwd', ffwd_button)
+        self._set('rwd', rwd_button)
+
+    def disconnect(self):
+        self.buttons = {}
@@ -0,0 +1,107 @@
+'''
+Mixer with a bank offset over song().visible_tracks. Moving the offset
+re-targets every strip, and each re-target asks for a MIDI map rebuild
+through the control elements, like the framework mixer does.
+'''
+
+from _Framework.ControlSurface import current_song
+
+
+class ChannelStripComponent(object):
+
+    def __init__(self):
+        self.name = ''
+        self._track = None
+        self._volume_control = None
+        self._arm_button = None
+        self._send_controls = ()
+
+    def set_track(self, track):
+        self._track = track
+        self._update()
+
+    def track(self):
+        return self._track
+
+    def set_volume_control(self, control):
+        if self._volume_control is not None:
+            self._volume_control.release_parameter()
+        self._volume_control = control
+        self._update()
+
+    def set_arm_button(self, button):
+        self._arm_button = button
+
+    def set_send_controls(self, controls):
+        self._send_controls = tuple(controls)
+
+    def _update(self):
+        if self._volume_control is not None:
+            if self._track is not None:
+                self._volume_control.connect_to(self._track.mixer_device.volume)
+            else:
+                self._volume_control.release_parameter()
+
+    def disconnect(self):
+        if self._volume_control is not None:
+            self._volume_control.release_parameter()
+
+
+class SpecialMixerComponent(object):
+
+    def __init__(self, num_tracks, *a, **k):
+        self.name = ''
+        self._track_offset = 0
+        self._channel_strips = [ChannelStripComponent() for _ in range(num_tracks)]
+        self._master_strip = ChannelStripComponent()
+        self._selected_strip = ChannelStripComponent()
+        self._next_bank_button = None
+        self._prev_bank_button = None
+        if current_song() is not None:
+            self._master_strip.set_track(current_song().master_track)
+            self._reassign_tracks()
+
+    def channel_strip(self, index):
+        return self._channel_strips[index]
+
+    def master_strip(self):
+        return self._master_strip
+
+    def selected_strip(self):
+        return self._selected_strip
+
+    def set_bank_buttons(self, next_button, prev_button):
+        if self._next_bank_button is not None:
+            self._next_bank_button.remove_value_listener(self._bank_up_value)
+        if self._prev_bank_button is not None:
+            self._prev_bank_button.remove_value_listener(self._bank_down_value)
+        self._next_bank_button = next_button
+        self._prev_bank_button = prev_button
+        if next_button is not None:
+            next_button.add_value_listener(self._bank_up_value)
+        if prev_button is not None:
+            prev_button.add_value_listener(self._bank_down_value)
+
+    def _bank_up_value(self, value):
+        if value:
+            self.set_track_offset(self._track_offset + len(self._channel_strips))
+
+    def _bank_down_value(self, value):
+        if value:
+            self.set_track_offset(max(0, self._track_offset - len(self._channel_strips)))
+
+    def set_track_offset(self, offset):
+        self._track_offset = offset
+        self._reassign_tracks()
+
+    def _reassign_tracks(self):
+        song = current_song()
+        tracks = song.visible_tracks if song is not None else ()
+        for index, strip in enumerate(self._channel_strips):
+            track_index = self._track_offset + index
+            strip.set_track(tracks[track_index] if track_index < len(tracks) else None)
+
+    def disconnect(self):
+        for strip in self._channel_strips:
+            strip.disconnect()
+        self._master_strip.disconnect()
@@ -0,0 +1,88 @@
+'''
+Runs the Komplete Kontrol control surface against the fake Live and
+_Framework modules in bench/fakelive.
+
+Importing this module puts the fakes and Komplete_Kontrol_Mk1_Core on
+sys.path, so FocusControl and friends import exactly as they do inside
+Live's MIDI Remote Scripts folder.
+'''
+
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+CORE_DIR = os.path.join(ROOT_DIR, 'Komplete_Kontrol_Mk1_Core')
+
+for path in (CORE_DIR, os.path.join(BENCH_DIR, 'fakelive')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import Live
+import FocusControl
+from GUtil import timer
+
+
+class RecordingCInstance(object):
+    '''
+    The c_instance Live hands to a control surface, recording everything the
+    script sends back: MIDI, log lines and MIDI map rebuild requests.
+    '''
+
+    def __init__(self, song, echo_log=False):
+        self._song = song
+        self.echo_log = echo_log
+        self.sent_midi = []
+        self.log_lines = []
+        self.messages = []
+        self.rebuild_requests = 0
+
+    def song(self):
+        return self._song
+
+    def send_midi(self, midi_bytes):
+        self.sent_midi.append(tuple(midi_bytes))
+
+    def log_message(self, message):
+        self.log_lines.append(message)
+        if self.echo_log:
+            sys.stdout.write(message + '\n')
+
+    def show_message(self, message):
+        self.messages.append(message)
+
+    def request_rebuild_midi_map(self):
+        self.rebuild_requests += 1
+
+    def clear(self):
+        self.sent_midi = []
+        self.log_lines = []
+        self.rebuild_requests = 0
+
+
+def create_surface(song, device_role=FocusControl.DEVICE_ROLE_DAW, c_instance=None):
+    '''Builds a FocusControl for song, the way Live does on script load.'''
+    if c_instance is None:
+        c_instance = RecordingCInstance(song)
+    surface = FocusControl.FocusControl(c_instance, device_role)
+    return surface, c_instance
+
+
+def tick(surface, count=1):
+    '''
+    Advances the surface by count control surface ticks, rebuilding the MIDI
+    map first whenever one was requested, as Live does between ticks.
+    '''
+    c_instance = surface._c_instance
+    for _ in range(count):
+        if c_instance.rebuild_requests:
+            c_instance.rebuild_requests = 0
+            surface.build_midi_map([])
+        surface.update_display()
+
+
+def timed(func, *a, **k):
+    '''Returns (seconds, result) for one call of func.'''
+    start = timer()
+    result = func(*a, **k)
+    return timer() - start, result
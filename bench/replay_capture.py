@@ -0,0 +1,163 @@
+'''
+Replays a MIDI capture (see MidiCapture, FocusControl.start_capture) into a
+FocusControl running against the fake Live, and reports how long each
+received message took to handle and whether the output matches the capture.
+
+    python bench/replay_capture.py KOMPLETE_KONTROL_DAW-20240101-120000.kkcap
+    python bench/replay_capture.py session.kkcap --tracks 300 --depth 4
+
+Ticks are replayed at --tick-ms intervals of the capture timestamps, so
+deferred work lands between the same messages it did in Live. The set is
+synthetic, so output that depends on the exact Live set (track names,
+instruments) only matches when the set is built to resemble it.
+'''
+
+from __future__ import print_function
+
+import argparse
+import difflib
+import gc
+
+import harness
+import synthetic
+
+import FocusControl
+from GUtil import timer
+from MidiCapture import read_capture, DIRECTION_IN, DIRECTION_OUT
+
+ROLES = {
+    'daw': FocusControl.DEVICE_ROLE_DAW,
+    'midi': FocusControl.DEVICE_ROLE_MIDI_KEYBOARD,
+}
+
+STATUS_NAMES = {
+    0x80: 'note off',
+    0x90: 'note on',
+    0xA0: 'aftertouch',
+    0xB0: 'cc',
+    0xC0: 'program',
+    0xD0: 'pressure',
+    0xE0: 'pitch bend',
+    0xF0: 'sysex',
+}
+
+
+def percentile(sorted_values, fraction):
+    '''Nearest-rank percentile of an already sorted list.'''
+    if not sorted_values:
+        return 0.0
+    rank = int(round(fraction * (len(sorted_values) - 1)))
+    return sorted_values[rank]
+
+
+def format_midi(midi_bytes):
+    return ' '.join('%02X' % byte for byte in midi_bytes)
+
+
+def replay(records, song, role, tick_us):
+    '''
+    Feeds the captured input into a fresh surface. Returns the per-message
+    latencies as [(status, seconds)], the MIDI the surface sent and the
+    errors raised while handling messages. Like Live, an error only loses
+    the message that raised it.
+    '''
+    surface, c_instance = harness.create_surface(song, role)
+    latencies = []
+    errors = []
+    ticks_done = 0
+    last_stamp = 0
+    gc.disable()
+    try:
+        for stamp, direction, midi_bytes in records:
+            last_stamp = stamp
+            if direction != DIRECTION_IN:
+                continue
+            while ticks_done < stamp // tick_us:
+                harness.tick(surface)
+                ticks_done += 1
+            start = timer()
+            try:
+                surface.receive_midi(midi_bytes)
+            except Exception as e:
+                errors.append((midi_bytes, e))
+            latencies.append((midi_bytes[0] & 0xF0, timer() - start))
+        while ticks_done <= last_stamp // tick_us + 1:
+            harness.tick(surface)
+            ticks_done += 1
+    finally:
+        gc.enable()
+    sent = list(c_instance.sent_midi)
+    surface.disconnect()
+    return latencies, sent, errors
+
+
+def report_latencies(latencies):
+    groups = {}
+    for status, seconds in latencies:
+        groups.setdefault(status, []).append(seconds)
+    groups[None] = [seconds for _, seconds in latencies]
+    print('%-12s %8s %10s %10s %10s %10s' % (
+        'message', 'count', 'p50 us', 'p90 us', 'p99 us', 'max us'))
+    for status in sorted(groups, key=lambda s: -1 if s is None else s):
+        values = sorted(groups[status])
+        name = 'all' if status is None else STATUS_NAMES.get(status, hex(status))
+        print('%-12s %8d %10.1f %10.1f %10.1f %10.1f' % (
+            name, len(values),
+            percentile(values, 0.50) * 1e6, percentile(values, 0.90) * 1e6,
+            percentile(values, 0.99) * 1e6, (values[-1] if values else 0.0) * 1e6))
+
+
+def report_output_diff(expected, produced, limit):
+    expected = [format_midi(midi_bytes) for midi_bytes in expected]
+    produced = [format_midi(midi_bytes) for midi_bytes in produced]
+    matcher = difflib.SequenceMatcher(None, expected, produced, autojunk=False)
+    matching = sum(block.size for block in matcher.get_matching_blocks())
+    print('output: %d recorded, %d replayed, %d in common' % (
+        len(expected), len(produced), matching))
+    if expected == produced:
+        print('output matches the capture')
+        return True
+    lines = list(difflib.unified_diff(expected, produced, 'recorded', 'replayed',
+                                      lineterm='', n=1))
+    for line in lines[:limit]:
+        print(line)
+    if len(lines) > limit:
+        print('... %d more diff lines' % (len(lines) - limit))
+    return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('capture', help='capture file written by MidiCapture')
+    parser.add_argument('--role', choices=sorted(ROLES), default='daw',
+                        help='device role of the replayed instance')
+    parser.add_argument('--tracks', type=int, default=16,
+                        help='tracks in the synthetic set')
+    parser.add_argument('--depth', type=int, default=1,
+                        help='rack nesting depth in the synthetic set')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--tick-ms', type=float, default=100.0,
+                        help='control surface tick interval to replay with')
+    parser.add_argument('--diff-lines', type=int, default=40,
+                        help='maximum output diff lines to print')
+    args = parser.parse_args(argv)
+
+    records = read_capture(args.capture)
+    expected = [midi_bytes for _, direction, midi_bytes in records
+                if direction == DIRECTION_OUT]
+    inputs = len(records) - len(expected)
+    print('%s: %d messages in, %d out, %.1f s' % (
+        args.capture, inputs, len(expected),
+        records[-1][0] / 1e6 if records else 0.0))
+
+    song = synthetic.build_set(args.tracks, rack_depth=args.depth, seed=args.seed)
+    latencies, produced, errors = replay(records, song, ROLES[args.role],
+                                         max(1, int(args.tick_ms * 1000)))
+    report_latencies(latencies)
+    for midi_bytes, error in errors:
+        print('error handling %s: %r' % (format_midi(midi_bytes), error))
+    report_output_diff(expected, produced, args.diff_lines)
+
+
+if __name__ == '__main__':
+    main()
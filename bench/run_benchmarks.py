@@ -0,0 +1,658 @@
+'''
+Benchmarks for FocusControl hot paths, run against the fake Live in
+bench/fakelive on synthetic sets.
+
+    python bench/run_benchmarks.py                 # full suite
+    python bench/run_benchmarks.py --quick         # small sets only
+    python bench/run_benchmarks.py --only find_instrument --depths 1 6
+
+Each benchmark prints wall time per operation together with the fake Live
+counters (listener traffic, property reads), which stand in for the work
+that would cross into Live's C++ side.
+'''
+
+from __future__ import print_function
+
+import argparse
+import gc
+import sys
+
+import harness
+import synthetic
+
+import Live
+import FocusControl
+from GUtil import timer
+from InstanceIdCache import PARAM_PREFIX
+from MixerBank import BANK_JUMP_STRIPS, BANK_JUMP_GROUP
+from SysEx import STATUS_HEADER
+from TrackTagIndex import TAG_NEEDS_MIDI_SOURCE
+from _Framework.EncoderElement import EncoderElement
+from _Framework.InputControlElement import MIDI_CC_TYPE
+from _Generic.SpecialMixerComponent import SpecialMixerComponent
+from _Framework.InputControlElement import MIDI_CC_STATUS, MIDI_NOTE_ON_STATUS
+
+DEFAULT_SIZES = (10, 100, 500, 2000)
+DEFAULT_DEPTHS = (1, 2, 4, 6)
+QUICK_SIZES = (10, 100)
+QUICK_DEPTHS = (1, 3)
+
+
+def measure(func, repeat, setup=None):
+    '''
+    Returns (best seconds per call, Live.STATS delta of the last call).
+    setup, if given, runs untimed before every call.
+    '''
+    best = None
+    stats = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        Live.reset_stats()
+        gc.disable()
+        try:
+            start = timer()
+            func()
+            elapsed = timer() - start
+        finally:
+            gc.enable()
+        stats = dict(Live.STATS)
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, stats
+
+
+def report(name, label, seconds, count, stats):
+    print('%-22s %-26s %10.1f us/op %8d ops  listeners +%d/-%d  reads %d' % (
+        name, label, seconds / count * 1e6, count,
+        stats['listeners_added'], stats['listeners_removed'],
+        stats['property_reads']))
+
+
+def fresh_surface(song, role=FocusControl.DEVICE_ROLE_DAW):
+    surface, c_instance = harness.create_surface(song, role)
+    harness.tick(surface, 3)
+    return surface, c_instance
+
+
+# -------------------------------------------------------------------------------------------
+# Benchmarks
+
+
+def bench_init(sizes, depths, repeat):
+    deferred = FocusControl.DEFER_STARTUP_WORK
+    try:
+        for size in sizes:
+            song = synthetic.build_set(size, rack_depth=1)
+            for defer in (False, True):
+                FocusControl.DEFER_STARTUP_WORK = defer
+                mode = 'deferred' if defer else 'eager'
+                surfaces = []
+
+                def disconnect():
+                    # Surfaces on the same song would share its model
+                    while surfaces:
+                        surfaces.pop().disconnect()
+
+                def create():
+                    surfaces.append(harness.create_surface(song)[0])
+
+                def settle():
+                    # Until every deferred listener is attached
+                    surface = harness.create_surface(song)[0]
+                    surfaces.append(surface)
+                    while surface._deferring_startup:
+                        harness.tick(surface)
+
+                seconds, stats = measure(create, repeat, disconnect)
+                report('init', '%d tracks, %s' % (size, mode), seconds, 1, stats)
+                if defer:
+                    seconds, stats = measure(settle, repeat, disconnect)
+                    report('init', '%d tracks, settled' % size, seconds, 1, stats)
+                disconnect()
+    finally:
+        FocusControl.DEFER_STARTUP_WORK = deferred
+
+
+def bench_two_instances(sizes, depths, repeat, changes=20):
+    '''
+    The DAW instance alone and with the MIDI keyboard instance loaded on the
+    same set, which shares the DAW instance's song model: startup, and a
+    burst of arm and devices changes handled over the following ticks.
+    '''
+    deferred = FocusControl.DEFER_STARTUP_WORK
+    try:
+        FocusControl.DEFER_STARTUP_WORK = False
+        for size in sizes:
+            song = synthetic.build_set(size, rack_depth=1)
+            tracks = [track for track in song._tracks if track.can_be_armed][:changes]
+            for roles in ((FocusControl.DEVICE_ROLE_DAW,),
+                          (FocusControl.DEVICE_ROLE_DAW, FocusControl.DEVICE_ROLE_MIDI_KEYBOARD)):
+                label = '%d tracks, %s' % (size, 'daw + midi' if len(roles) > 1 else 'daw')
+                surfaces = []
+
+                def disconnect():
+                    while surfaces:
+                        surfaces.pop().disconnect()
+
+                def create():
+                    for role in roles:
+                        surfaces.append(harness.create_surface(song, role)[0])
+
+                def changed():
+                    for track in tracks:
+                        track.arm = not track.arm
+                        track.devices = list(track.devices)
+                    for surface in surfaces:
+                        harness.tick(surface, 2)
+
+                seconds, stats = measure(create, repeat, disconnect)
+                report('two_instances', label + ', init', seconds, 1, stats)
+                for surface in surfaces:
+                    harness.tick(surface, 3)
+                seconds, stats = measure(changed, repeat)
+                report('two_instances', label + ', changes', seconds, len(tracks), stats)
+                disconnect()
+    finally:
+        FocusControl.DEFER_STARTUP_WORK = deferred
+
+
+def bench_receive_midi(sizes, depths, repeat, messages=2000):
+    traffic = []
+    for i in range(messages):
+        kind = i % 4
+        if kind == 0:
+            traffic.append((MIDI_NOTE_ON_STATUS, 94, 127 if i % 8 else 0))
+        elif kind == 1:
+            traffic.append((MIDI_CC_STATUS, 22 + i % 8, i % 128))
+        elif kind == 2:
+            traffic.append((MIDI_NOTE_ON_STATUS, 60, 100))
+        else:
+            traffic.append((MIDI_NOTE_ON_STATUS, 91, 127 if i % 8 < 4 else 0))
+
+    for size in sizes:
+        song = synthetic.build_set(size, rack_depth=1)
+        surface, c_instance = fresh_surface(song)
+
+        def run():
+            receive = surface.receive_midi
+            for midi_bytes in traffic:
+                receive(midi_bytes)
+
+        seconds, stats = measure(run, repeat)
+        surface.disconnect()
+        report('receive_midi', '%d tracks' % size, seconds, len(traffic), stats)
+
+
+def bench_navigate(sizes, depths, repeat, presses=200):
+    for size in sizes:
+        song = synthetic.build_set(size, rack_depth=1)
+        start_track = song.tracks[size // 2]
+        song.view.selected_track = start_track
+        start_track.arm = True
+        surface, c_instance = fresh_surface(song)
+
+        def run():
+            song.view.selected_track = start_track
+            for i in range(presses):
+                surface.navigate_midi_track(1 if (i // 10) % 2 == 0 else -1)
+
+        seconds, stats = measure(run, repeat)
+        surface.disconnect()
+        report('navigate_midi_track', '%d tracks' % size, seconds, presses, stats)
+
+
+def bench_assign_tracks(sizes, depths, repeat):
+    for size in sizes:
+        song = synthetic.build_set(size, rack_depth=1)
+        surface, c_instance = fresh_surface(song)
+        tracks = list(song._tracks)
+
+        def reorder():
+            # Move the last track to the front, as a drag in Live would
+            tracks.insert(0, tracks.pop())
+            song._tracks = list(tracks)
+            surface._assign_tracks()
+
+        seconds, stats = measure(reorder, repeat)
+        report('_assign_tracks', '%d tracks, move one' % size, seconds, 1, stats)
+
+        def add_one():
+            song._tracks.append(Live.Track('Added'))
+            surface._assign_tracks()
+
+        seconds, stats = measure(add_one, repeat)
+        report('_assign_tracks', '%d tracks, add one' % size, seconds, 1, stats)
+        surface.disconnect()
+
+
+def bench_activation(sizes, depths, repeat, arms=40):
+    '''
+    Tracks armed in quick succession, several per tick, as multi-arming
+    in Live does. Reports the activations that ran, the ones superseded by
+    a later arm and the status SysEx that reached the keyboard.
+    '''
+    for per_tick in (1, 2, 4):
+        song = synthetic.build_set(arms + 2)
+        tracks = [track for track in song._tracks if track.can_be_armed][:arms]
+        surface, c_instance = fresh_surface(song)
+        activation = surface._activation
+
+        def run():
+            for track in song._tracks:
+                if track.can_be_armed:
+                    track.arm = False
+            harness.tick(surface, 3)
+            c_instance.clear()
+            activation.ran = activation.superseded = 0
+            for start in range(0, len(tracks), per_tick):
+                for track in tracks[start:start + per_tick]:
+                    track.arm = True
+                harness.tick(surface)
+            harness.tick(surface, 3)
+
+        seconds, stats = measure(run, repeat)
+        status = [m for m in c_instance.sent_midi
+                  if tuple(m[:len(STATUS_HEADER)]) == tuple(STATUS_HEADER)]
+        report('activation', '%d arms/tick' % per_tick, seconds, len(tracks), stats)
+        print('%-22s %-26s %d arms -> %d activations, %d superseded, %d status SysEx, controlled %s' % (
+            '', '', len(tracks), activation.ran, activation.superseded, len(status),
+            surface.controlled_track.name if surface.controlled_track else None))
+        surface.disconnect()
+
+
+def bench_find_instrument(sizes, depths, repeat, tracks_per_set=20):
+    for depth in depths:
+        song = synthetic.build_set(tracks_per_set, rack_depth=depth,
+                                   parameter_count=16)
+        surface, c_instance = fresh_surface(song)
+        tracks = [track for track in song._tracks if track.can_be_armed]
+
+        def cold():
+            surface._model.instrument_cache.clear()
+            for track in tracks:
+                surface.find_track_instrument(track)
+
+        def warm():
+            for track in tracks:
+                surface.find_track_instrument(track)
+
+        seconds, stats = measure(cold, repeat)
+        report('find_instrument', 'depth %d, cold' % depth, seconds, len(tracks), stats)
+        # The first lookup after a cold one stores the entries
+        warm()
+        seconds, stats = measure(warm, repeat)
+        report('find_instrument', 'depth %d, cached' % depth, seconds, len(tracks), stats)
+        surface.disconnect()
+
+
+def bench_instance_ids(sizes, depths, repeat):
+    '''
+    Resolving every track after their devices changed, with the Komplete
+    Kontrol instance IDs read from the parameter lists and from the
+    listener-driven ID cache, then an instance ID change on the controlled
+    track reaching the keyboard as a status update.
+    '''
+    for size in sizes:
+        song = synthetic.build_set(size)
+        song.tracks[0].arm = True
+        surface, c_instance = fresh_surface(song)
+        model = surface._model
+        tracks = [track for track in song._tracks if track.can_be_armed]
+
+        def resolve():
+            model.instrument_cache.clear()
+            for track in tracks:
+                surface.find_track_instrument(track)
+
+        def uncached():
+            model.instance_ids.clear()
+            resolve()
+
+        for label, run in (('parameter lists', uncached), ('ID cache', resolve)):
+            model.instance_ids.parameter_reads = 0
+            seconds, stats = measure(run, repeat)
+            report('instance_ids', '%d tracks, %s' % (size, label), seconds, len(tracks), stats)
+            print('%-22s %-26s %d parameter list reads per run' % (
+                '', '', model.instance_ids.parameter_reads // repeat))
+
+        parameter = song.tracks[0].devices[0].parameters[1]
+        c_instance.clear()
+        parameter.name = 'NIKB42'
+        harness.tick(surface, 3)
+        status = [m for m in c_instance.sent_midi
+                  if tuple(m[:len(STATUS_HEADER)]) == tuple(STATUS_HEADER)]
+        print('%-22s %-26s ID change -> %s, %d status SysEx' % (
+            '', '', surface.find_track_instrument(song.tracks[0]), len(status)))
+        surface.disconnect()
+
+
+class LegacyTraversal(object):
+    '''
+    The recursion find_instrument used before the single-pass traversal,
+    without the cache: every chain device is resolved, and a rack resolves
+    its winning device once more. Kept to compare visits and results.
+    '''
+
+    def __init__(self, surface):
+        self.surface = surface
+        self.visits = 0
+
+    def find_instrument(self, device):
+        self.visits += 1
+        is_ni = self.surface.device_is_ni
+        if device.type != 1:
+            return None
+        if device.can_have_chains:
+            pairs = []
+            for chain in device.chains:
+                (winner, instr) = self.find_in_chain(chain)
+                if instr:
+                    if is_ni(winner):
+                        return self.find_instrument(winner)
+                    pairs.append((winner, instr))
+            if pairs:
+                return self.find_instrument(pairs[0][0])
+        elif is_ni(device):
+            pn = device.parameters[1].name
+            if pn.startswith(PARAM_PREFIX):
+                return (str(device.class_display_name), str(pn[4:]))
+        return (device.class_display_name, None)
+
+    def find_in_chain(self, chain):
+        pairs = []
+        for device in chain.devices:
+            instr = self.find_instrument(device)
+            if instr:
+                pairs.append((device, instr))
+        for device, instr in pairs:
+            if self.surface.device_is_ni(device):
+                return (device, instr)
+        return pairs[0] if pairs else (None, None)
+
+
+def count_devices(devices):
+    count = 0
+    for device in devices:
+        count += 1
+        if device.can_have_chains:
+            for chain in device.chains:
+                count += count_devices(chain.devices)
+    return count
+
+
+def bench_rack_traversal(sizes, depths, repeat):
+    '''
+    Devices resolved per track for the legacy recursion and the single-pass
+    traversal on racks nested depth levels deep, checking both agree. The
+    cold lookup walks without storing anything; the storing lookup is the
+    next one, which also puts listeners on the racks leading to each track's
+    instrument. Legacy and cold lookups are timed alternately and compared
+    on their best runs, with the Komplete Kontrol instance IDs already
+    cached, as they are in a running set.
+    '''
+    for depth in sorted(set(depths) | set((8,))):
+        song = synthetic.build_set(6, rack_depth=depth, parameter_count=16)
+        surface, c_instance = fresh_surface(song)
+        tracks = [track for track in song._tracks if track.can_be_armed]
+        cache = surface._model.instrument_cache
+        legacy = LegacyTraversal(surface)
+        devices = sum(count_devices(track.devices) for track in tracks)
+
+        def run_legacy():
+            legacy.visits = 0
+            for track in tracks:
+                for device in track.devices:
+                    if legacy.find_instrument(device):
+                        break
+
+        def run_single_pass():
+            surface.instrument_visits = 0
+            for track in tracks:
+                surface.find_track_instrument(track)
+
+        run_single_pass()
+        legacy_seconds = cold_seconds = None
+        for _ in range(repeat):
+            seconds, legacy_stats = measure(run_legacy, 1)
+            legacy_seconds = min(seconds, legacy_seconds or seconds)
+            seconds, cold_stats = measure(run_single_pass, 1, setup=cache.clear)
+            cold_seconds = min(seconds, cold_seconds or seconds)
+        legacy_visits = legacy.visits
+        cold_visits = surface.instrument_visits
+        report('rack_traversal', 'depth %d, legacy' % depth, legacy_seconds,
+               len(tracks), legacy_stats)
+        report('rack_traversal', 'depth %d, cold lookup' % depth, cold_seconds,
+               len(tracks), cold_stats)
+
+        def first_lookup():
+            cache.clear()
+            run_single_pass()
+
+        seconds, stats = measure(run_single_pass, repeat, setup=first_lookup)
+        report('rack_traversal', 'depth %d, storing lookup' % depth, seconds, len(tracks), stats)
+
+        agree = all(surface.find_track_instrument(track) ==
+                    next((r for r in map(legacy.find_instrument, track.devices) if r), None)
+                    for track in tracks)
+        ratio = cold_seconds / legacy_seconds
+        print('%-22s %-26s %d devices, visits legacy %d, single pass %d, results %s' % (
+            '', '', devices, legacy_visits, cold_visits, 'agree' if agree else 'DIFFER'))
+        print('%-22s %-26s cold lookup vs legacy: %.2fx time, %.2fx reads, %s' % (
+            '', '', ratio, float(cold_stats['property_reads']) / legacy_stats['property_reads'],
+            'no regression' if ratio <= 1.1 else 'REGRESSION'))
+        surface.disconnect()
+
+
+def bench_display(sizes, depths, repeat, ticks=50, writes_per_tick=4):
+    '''
+    Track names written to the display as fast navigation would, some too
+    long for a grid, counting the display SysEx that reach the keyboard.
+    '''
+    song = synthetic.build_set(10)
+    surface, c_instance = fresh_surface(song)
+    names = ['Track %d' % i if i % 3 else
+             'Komplete Kontrol Track With A Long Name %d' % i
+             for i in range(ticks * writes_per_tick)]
+
+    def run():
+        surface._display.clear()
+        c_instance.clear()
+        for start in range(0, len(names), writes_per_tick):
+            for name in names[start:start + writes_per_tick]:
+                surface.send_to_display(name, 0)
+            harness.tick(surface)
+
+    seconds, stats = measure(run, repeat)
+    sysex = len([m for m in c_instance.sent_midi if m[0] == 240])
+    report('display', '%d writes/tick' % writes_per_tick, seconds, len(names), stats)
+    print('%-22s %-26s %d writes -> %d display SysEx' % ('', '', len(names), sysex))
+    surface.disconnect()
+
+
+def bench_output(sizes, depths, repeat, bursts=20):
+    '''
+    Bursts of status and display SysEx for long track names with an LED
+    change in each, reporting the output scheduler's queue depth and wait
+    figures per priority.
+    '''
+    song = synthetic.build_set(10)
+    surface, c_instance = fresh_surface(song)
+    track = song.tracks[0]
+    track.name = 'A Komplete Kontrol track with a very long name' * 2
+
+    def run():
+        for burst in range(bursts):
+            for i in range(8):
+                surface.update_status_midi(i, track, ('Komplete Kontrol', '%02d' % i), 1)
+                surface._send_display_grid(i % 4, 'Grid text %d %d' % (burst, i))
+            surface._send_midi((MIDI_NOTE_ON_STATUS, 94, 127 if burst % 2 else 0))
+            harness.tick(surface)
+        harness.tick(surface, 5)
+
+    seconds, stats = measure(run, repeat)
+    report('output', '%d bytes/tick' % surface._output.bytes_per_tick, seconds, bursts, stats)
+    for name, entry in sorted(surface._output.stats().items()):
+        print('%-22s %-26s sent %d, replaced %d, max depth %d, wait mean %.1f max %d ticks' % (
+            '', name, entry['sent'], entry['replaced'], entry['max_depth'],
+            entry['mean_wait_ticks'], entry['max_wait_ticks']))
+    surface.disconnect()
+
+
+def bench_mixer_bank(sizes, depths, repeat, moves=20):
+    '''
+    Bank moves over the 7 volume faders: the framework mixer, which
+    re-targets every strip and rebuilds the MIDI map, against the
+    script-side MixerBank, by strips and jumping between group tracks and
+    [M] tagged tracks. Each move is followed by a tick, where the framework
+    mixer's MIDI map rebuild happens.
+    '''
+    saved = (FocusControl.MIXER_BANK_CCS, FocusControl.MIXER_BANK_JUMP)
+    try:
+        for size in sizes:
+            song = synthetic.build_set(size)
+            for index, track in enumerate(song._tracks):
+                if index % 12 == 0:
+                    track.is_foldable = True
+
+            FocusControl.MIXER_BANK_CCS = None
+            surface, c_instance = fresh_surface(song)
+            with surface.component_guard():
+                mixer = SpecialMixerComponent(len(FocusControl.VOLUME_CCS))
+                for index, cc in enumerate(FocusControl.VOLUME_CCS):
+                    mixer.channel_strip(index).set_volume_control(EncoderElement(
+                        MIDI_CC_TYPE, 0, cc, FocusControl.ABSOLUTE_MAP_MODE))
+            harness.tick(surface)
+
+            def framework():
+                c_instance.rebuild_requests = 0
+                rebuilds = 0
+                for i in range(moves):
+                    offset = (i % 4) * len(FocusControl.VOLUME_CCS)
+                    mixer.set_track_offset(offset)
+                    rebuilds += c_instance.rebuild_requests
+                    harness.tick(surface)
+                return rebuilds
+
+            seconds, stats = measure(framework, repeat)
+            rebuilds = framework()
+            report('mixer_bank', '%d tracks, framework' % size, seconds, moves, stats)
+            print('%-22s %-26s %d MIDI map rebuilds' % ('', '', rebuilds))
+            mixer.disconnect()
+            surface.disconnect()
+
+            for label, jump in (('strips', BANK_JUMP_STRIPS), ('group jump', BANK_JUMP_GROUP),
+                                ('tag jump', TAG_NEEDS_MIDI_SOURCE)):
+                FocusControl.MIXER_BANK_CCS = (38, 39)
+                FocusControl.MIXER_BANK_JUMP = jump
+                surface, c_instance = fresh_surface(song)
+                bank = surface._mixer_bank
+
+                def script_side():
+                    c_instance.rebuild_requests = 0
+                    rebuilds = 0
+                    for i in range(moves):
+                        surface.move_mixer_bank(1 if (i // 4) % 2 == 0 else -1)
+                        rebuilds += c_instance.rebuild_requests
+                        harness.tick(surface)
+                    return rebuilds
+
+                seconds, stats = measure(script_side, repeat)
+                rebuilds = script_side()
+                report('mixer_bank', '%d tracks, %s' % (size, label), seconds, moves, stats)
+                print('%-22s %-26s %d MIDI map rebuilds, %s' % (
+                    '', '', rebuilds, bank.describe()))
+                surface.disconnect()
+    finally:
+        FocusControl.MIXER_BANK_CCS, FocusControl.MIXER_BANK_JUMP = saved
+
+
+def bench_encoders(sizes, depths, repeat, ticks=50):
+    '''
+    A fast spin of encoder 1 at several speeds (CCs per tick), absolute and
+    two's complement relative, with script-side encoders. Reports how many
+    parameter writes the CCs turned into.
+    '''
+    modes = (
+        ('absolute', FocusControl.ABSOLUTE_MAP_MODE),
+        ('relative', Live.MidiMap.MapMode.relative_two_compliment),
+    )
+    saved = (FocusControl.SCRIPT_SIDE_ENCODERS, FocusControl.ENCODER_MAP_MODE)
+    try:
+        FocusControl.SCRIPT_SIDE_ENCODERS = True
+        for label, map_mode in modes:
+            FocusControl.ENCODER_MAP_MODE = map_mode
+            for speed in (1, 4, 16):
+                song = synthetic.build_set(4, parameter_count=16)
+                song.view.selected_track = song.tracks[0]
+                surface, c_instance = fresh_surface(song)
+                parameter = song.tracks[0].devices[0].parameters[1]
+                traffic = []
+                for i in range(ticks * speed):
+                    if map_mode == FocusControl.ABSOLUTE_MAP_MODE:
+                        traffic.append((MIDI_CC_STATUS, 22, i % 128))
+                    else:
+                        traffic.append((MIDI_CC_STATUS, 22, 1))
+
+                def run():
+                    parameter.value = 0.0
+                    parameter.writes = 0
+                    receive = surface.receive_midi
+                    for start in range(0, len(traffic), speed):
+                        for midi_bytes in traffic[start:start + speed]:
+                            receive(midi_bytes)
+                        harness.tick(surface)
+
+                seconds, stats = measure(run, repeat)
+                surface.disconnect()
+                report('encoders', '%s, %d CC/tick' % (label, speed),
+                       seconds, len(traffic), stats)
+                print('%-22s %-26s %10d CCs -> %d writes, value %.3f' % (
+                    '', '', len(traffic), parameter.writes, parameter.value))
+    finally:
+        FocusControl.SCRIPT_SIDE_ENCODERS, FocusControl.ENCODER_MAP_MODE = saved
+
+
+BENCHMARKS = (
+    ('init', bench_init),
+    ('two_instances', bench_two_instances),
+    ('receive_midi', bench_receive_midi),
+    ('navigate', bench_navigate),
+    ('assign_tracks', bench_assign_tracks),
+    ('activation', bench_activation),
+    ('find_instrument', bench_find_instrument),
+    ('rack_traversal', bench_rack_traversal),
+    ('instance_ids', bench_instance_ids),
+    ('mixer_bank', bench_mixer_bank),
+    ('encoders', bench_encoders),
+    ('display', bench_display),
+    ('output', bench_output),
+)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quick', action='store_true',
+                        help='small sets and shallow racks only')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        help='track counts (default %s)' % (DEFAULT_SIZES,))
+    parser.add_argument('--depths', type=int, nargs='+',
+                        help='rack nesting depths (default %s)' % (DEFAULT_DEPTHS,))
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per measurement, best is reported')
+    parser.add_argument('--only', nargs='+', choices=[name for name, _ in BENCHMARKS],
+                        help='run only these benchmarks')
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes or (QUICK_SIZES if args.quick else DEFAULT_SIZES)
+    depths = args.depths or (QUICK_DEPTHS if args.quick else DEFAULT_DEPTHS)
+
+    print('Python %s' % sys.version.split()[0])
+    for name, benchmark in BENCHMARKS:
+        if args.only and name not in args.only:
+            continue
+        benchmark(sizes, depths, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
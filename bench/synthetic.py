@@ -0,0 +1,90 @@
+'''
+Synthetic Live sets for the benchmarks: a mix of Komplete Kontrol tracks,
+plain instrument tracks, audio tracks and Instrument Racks nested to a
+configurable depth.
+'''
+
+import random
+
+import Live
+from Live import Chain, Device, DeviceParameter, DeviceType, Song, Track
+
+KK_PARAMETER_COUNT = 400
+
+
+def komplete_kontrol(instance_id, parameter_count=KK_PARAMETER_COUNT):
+    parameters = [DeviceParameter('Device On', 1.0),
+                  DeviceParameter('NIKB%02d' % instance_id)]
+    parameters.extend(DeviceParameter('Param %d' % i)
+                      for i in range(parameter_count - 2))
+    return Device('Komplete Kontrol', 'PluginDevice', 'Komplete Kontrol',
+                  parameters=parameters)
+
+
+def simpler():
+    parameters = [DeviceParameter('Device On', 1.0)]
+    parameters.extend(DeviceParameter('Macro %d' % i) for i in range(8))
+    return Device('Simpler', 'OriginalSimpler', 'Simpler', parameters=parameters)
+
+
+def effect(name='Reverb'):
+    return Device(name, name, name, type=DeviceType.audio_effect)
+
+
+def instrument_rack(chains):
+    parameters = [DeviceParameter('Device On', 1.0)]
+    parameters.extend(DeviceParameter('Macro %d' % i) for i in range(8))
+    return Device('Instrument Rack', 'InstrumentGroupDevice', 'Instrument Rack',
+                  parameters=parameters, chains=chains)
+
+
+def nested_rack(depth, width, leaf_factory):
+    '''
+    A rack of width chains, each holding a plain instrument followed by a
+    rack one level shallower; the innermost chains hold leaf_factory().
+    '''
+    if depth <= 1:
+        return instrument_rack([Chain('Chain %d' % i, [leaf_factory()])
+                                for i in range(width)])
+    chains = []
+    for i in range(width):
+        chains.append(Chain('Chain %d' % i,
+                            [simpler(), nested_rack(depth - 1, width, leaf_factory)]))
+    return instrument_rack(chains)
+
+
+def build_set(track_count, rack_depth=0, rack_width=2, seed=0, kk_every=3,
+              parameter_count=KK_PARAMETER_COUNT):
+    '''
+    Returns a Song with track_count tracks. Every kk_every-th track holds a
+    Komplete Kontrol instance (inside a rack of rack_depth levels when
+    rack_depth > 0), one track in ten is an audio track, and a few tracks
+    carry the [M] / [MIDISRC] name tags.
+    '''
+    rng = random.Random(seed)
+    tracks = []
+    for index in range(track_count):
+        if index % 10 == 9 and index != track_count - 1:
+            tracks.append(Track('Audio %d' % index, can_be_armed=True,
+                                has_midi_input=False, devices=[effect()]))
+            continue
+        name = 'Track %d' % index
+        if index % 25 == 5:
+            name += ' [M]'
+        if index == track_count - 1 and track_count > 1:
+            name = 'Scale [MIDISRC]'
+        if index % kk_every == 0:
+            leaf = lambda: komplete_kontrol(index % 100, parameter_count)
+        else:
+            leaf = simpler
+        if rack_depth > 0:
+            instrument = nested_rack(rack_depth, rack_width, leaf)
+        else:
+            instrument = leaf()
+        devices = [instrument, effect('EQ Eight')]
+        if rng.random() < 0.2:
+            devices.insert(0, effect('Arpeggiator'))
+        tracks.append(Track(name, devices=devices))
+    tracks.append(Track('Group', can_be_armed=False, has_midi_input=False,
+                        is_foldable=True))
+    return Song(tracks)